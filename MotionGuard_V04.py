@@ -1,9 +1,24 @@
-import tkinter as tk
-from tkinter import Canvas, messagebox, ttk, filedialog
-import webbrowser
+import time
+IMPORT_START = time.perf_counter()  # Used to report import-to-first-frame time
+
+import argparse
 import subprocess
+import signal
 import sys
 import os
+import configparser
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import bisect
+import json
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# GUI, audio, email and HTTP modules are imported on demand, so the headless
+# daemon starts quickly and does not need Tk, Pillow or pygame
 
 # Function to check and install dependencies if missing
 def check_install(package, import_name=None):
@@ -15,7 +30,7 @@ def check_install(package, import_name=None):
         print(f"Installing {package}...")
         subprocess.check_call([sys.executable, "-m", "pip", "install", package])
 
-# Ensure required dependencies are installed
+# Dependencies installed by '--install-deps' (never at runtime)
 dependencies = {
     "opencv-python": "cv2",
     "Pillow": "PIL",
@@ -25,35 +40,40 @@ dependencies = {
     "email": "email.mime.text",
 }
 
-for package, import_name in dependencies.items():
-    check_install(package, import_name)
 
-# After ensuring dependencies are installed, import them
-from PIL import Image, ImageGrab, ImageTk
-import cv2
-import numpy as np
-import pygame
-import configparser
-import time
-import threading
-import smtplib
-from email.mime.text import MIMEText
+def import_gui():
+    """Imports the Tk and Pillow modules used by the GUI."""
+    global tk, Canvas, messagebox, ttk, filedialog, webbrowser, Image, ImageGrab, ImageTk
+    import tkinter as tk
+    from tkinter import Canvas, messagebox, ttk, filedialog
+    import webbrowser
+    from PIL import Image, ImageGrab, ImageTk
 
-# Initialize pygame for sound playing
-pygame.mixer.init()
 
-# Load configuration
-config = configparser.ConfigParser()
-config_file = "config.ini"
+pygame = None  # Imported by load_audio() on first use
+audio_available = None
 
-if os.path.exists(config_file):
-    config.read(config_file)
-    # Ensure 'volume' is in the SoundAlert section, add it if missing
-    if 'volume' not in config['SoundAlert']:
-        config['SoundAlert']['volume'] = '1.0'
-else:
-    config['SoundAlert'] = {'enabled': 'False', 'sound_file': '', 'volume': '1.0'}
-    config['SMTP'] = {
+
+def load_audio():
+    """Imports pygame and initializes the mixer on first use, returns None if audio is unavailable."""
+    global pygame, audio_available
+    if audio_available is None:
+        try:
+            import pygame as pygame_module
+            pygame_module.mixer.init()
+            pygame = pygame_module
+            audio_available = True
+        except Exception as e:
+            # Missing pygame or no audio device
+            print(f"Audio disabled: {e}")
+            audio_available = False
+    return pygame if audio_available else None
+
+
+# Default configuration, missing sections and keys are added on startup
+default_config = {
+    'SoundAlert': {'enabled': 'False', 'sound_file': '', 'volume': '1.0'},
+    'SMTP': {
         'enabled': 'False',
         'server': '',
         'port': '',
@@ -61,12 +81,2555 @@ else:
         'password': '',
         'recipient': '',
         'subject': 'Motion Detected',
-        'body': 'Motion detected by the application.'
+        'body': 'Motion detected by the application.',
+        'min_interval': '30',
+        'queue_size': '100'
+    },
+    'Capture': {'backend': 'pil', 'replay_path': '', 'replay_loop': 'False'},
+    'Detection': {'tile_size': '0', 'tile_sample_step': '4', 'target_fps': '10', 'idle_fps': '5', 'idle_backoff': '5',
+                  'scoring_threads': '0', 'engine': 'thread', 'workers': '0', 'localize': 'False', 'localize_scale': '0.25',
+                  'min_blob_area': '25', 'pyramid': '0', 'pyramid_margin': '2'},
+    'Recording': {'enabled': 'False', 'pre_seconds': '5', 'post_seconds': '5', 'max_mb': '64', 'scale': '0.5',
+                  'jpeg_quality': '0', 'format': 'video', 'output_dir': 'clips'},
+    'Preview': {'enabled': 'False', 'max_fps': '2', 'width': '240'},
+    'Metrics': {'enabled': 'False', 'http_host': '127.0.0.1', 'http_port': '0', 'json_log': '', 'log_interval': '60'},
+    'Journal': {'enabled': 'False', 'path': 'events.db', 'batch_size': '100', 'flush_interval': '1'},
+    'Server': {'enabled': 'False', 'host': '127.0.0.1', 'port': '8765', 'preview_fps': '2', 'jpeg_quality': '70',
+               'client_queue': '100'},
+}
+
+# Configuration, filled by load_config()
+config = configparser.ConfigParser()
+config_file = "config.ini"
+
+
+def load_config(path="config.ini"):
+    """Reads the configuration file, adding missing sections and keys.
+
+    The file is only written when it is missing or something was added.
+    """
+    global config_file
+    config_file = path
+    changed = not os.path.exists(path)
+    if not changed:
+        config.read(path)
+
+    for section, values in default_config.items():
+        if section not in config:
+            config[section] = {}
+        for key, value in values.items():
+            if key not in config[section]:
+                config[section][key] = value
+                changed = True
+
+    # Save the updated configuration (in case sections or keys were missing)
+    if changed:
+        save_config()
+
+
+def save_config():
+    with open(config_file, 'w') as configfile:
+        config.write(configfile)
+
+
+def copy_into(frame, out=None):
+    """Copies a frame into 'out' when shapes match, otherwise returns a new copy."""
+    if out is None or out.shape != frame.shape:
+        return frame.copy()
+    np.copyto(out, frame)
+    return out
+
+
+class Histogram:
+    """Cumulative histogram with fixed bucket bounds, in the Prometheus style."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Low-overhead registry of counters, gauges and histograms.
+
+    Metrics are keyed by name and optional labels. Gauges can also be
+    registered as callables (e.g. queue depths), evaluated on export only.
+    """
+
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.gauge_functions = {}
+        self.histograms = {}
+
+    @staticmethod
+    def key(name, labels):
+        return (name, tuple(sorted(labels.items())))
+
+    def inc(self, name, value=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        self.gauges[self.key(name, labels)] = value
+
+    def register_gauge(self, name, function, **labels):
+        """Registers a callable returning the gauge value at export time."""
+        self.gauge_functions[self.key(name, labels)] = function
+
+    def unregister_gauge(self, name, function=None, **labels):
+        """Removes a gauge callable, only if it is still 'function' when given."""
+        key = self.key(name, labels)
+        if function is None or self.gauge_functions.get(key) == function:
+            self.gauge_functions.pop(key, None)
+
+    def observe(self, name, value, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.DEFAULT_BUCKETS)
+            histogram.observe(value)
+
+    def collect_gauges(self):
+        gauges = dict(self.gauges)
+        for key, function in list(self.gauge_functions.items()):
+            try:
+                gauges[key] = function()
+            except Exception as e:
+                print(f"Error reading gauge {key[0]}: {e}")
+        return gauges
+
+    def snapshot(self):
+        """Returns all metrics as a JSON-serialisable dict."""
+        def name_of(key):
+            name, labels = key
+            return name + ''.join(f"[{k}={v}]" for k, v in labels)
+
+        with self.lock:
+            counters = {name_of(key): value for key, value in self.counters.items()}
+            histograms = {
+                name_of(key): {'count': h.count, 'sum': round(h.sum, 6), 'buckets': dict(zip(map(str, h.buckets + ('+Inf',)), h.counts))}
+                for key, h in self.histograms.items()
+            }
+        gauges = {name_of(key): value for key, value in self.collect_gauges().items()}
+        return {'time': time.time(), 'counters': counters, 'gauges': gauges, 'histograms': histograms}
+
+    def to_prometheus(self, prefix="motionguard_"):
+        """Renders all metrics in the Prometheus text exposition format."""
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        def labels_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}' if pairs else ''
+
+        lines = []
+        typed = set()
+
+        def add_type(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {prefix}{name} {kind}")
+
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = [(key, h.buckets, list(h.counts), h.sum, h.count) for key, h in sorted(self.histograms.items())]
+        for (name, labels), value in counters:
+            add_type(name, 'counter')
+            lines.append(f"{prefix}{name}{labels_text(labels)} {value}")
+        for (name, labels), value in sorted(self.collect_gauges().items()):
+            add_type(name, 'gauge')
+            lines.append(f"{prefix}{name}{labels_text(labels)} {value}")
+        for (name, labels), buckets, counts, total, count in histograms:
+            add_type(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f"{prefix}{name}_bucket{labels_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{prefix}{name}_sum{labels_text(labels)} {total}")
+            lines.append(f"{prefix}{name}_count{labels_text(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+# Metrics shared by the detection loop, alerts and the exporters
+metrics = Metrics()
+
+
+def metrics_request_handler():
+    """Returns the handler class serving the metrics registry on /metrics."""
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = self.server.metrics.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep scrapes out of the console
+
+    return MetricsRequestHandler
+
+
+class MetricsExporter:
+    """Exposes metrics on a local HTTP /metrics endpoint and/or a periodic JSON log."""
+
+    def __init__(self, metrics, host='127.0.0.1', port=0, json_log='', log_interval=60):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.json_log = json_log
+        self.log_interval = log_interval
+        self.server = None
+        self.stop_event = threading.Event()
+
+    def start(self):
+        if self.port:
+            from http.server import ThreadingHTTPServer
+            self.server = ThreadingHTTPServer((self.host, self.port), metrics_request_handler())
+            self.server.daemon_threads = True
+            self.server.metrics = self.metrics
+            threading.Thread(target=self.server.serve_forever, daemon=True, name="metrics-http").start()
+            print(f"Serving metrics on http://{self.host}:{self.server.server_address[1]}/metrics")
+        if self.json_log:
+            threading.Thread(target=self.log_loop, daemon=True, name="metrics-log").start()
+
+    def log_loop(self):
+        while not self.stop_event.wait(self.log_interval):
+            self.write_log()
+
+    def write_log(self):
+        try:
+            with open(self.json_log, 'a') as log_file:
+                log_file.write(json.dumps(self.metrics.snapshot()) + '\n')
+        except Exception as e:
+            print(f"Error writing metrics log: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.json_log:
+            self.write_log()
+
+
+class CaptureSource:
+    """Base class for frame sources used by the motion detection loop.
+
+    A source produces grayscale uint8 frames. Reading is split in two stages,
+    capture() returns the backend's native frame and convert() turns it into a
+    grayscale NumPy array, written into 'out' when a buffer is given.
+    """
+
+    def __init__(self, bbox=None):
+        self.bbox = bbox
+        self.shape = None
+
+    def open(self):
+        """Acquires backend resources. Called from the thread that reads frames."""
+
+    def close(self):
+        """Releases backend resources."""
+
+    def capture(self):
+        """Returns the next native frame, or None when the source is exhausted."""
+        raise NotImplementedError
+
+    def convert(self, raw, out=None):
+        """Converts a native frame to a grayscale uint8 array."""
+        raise NotImplementedError
+
+    def read(self, out=None):
+        """Captures and converts the next frame, returns None when exhausted."""
+        raw = self.capture()
+        if raw is None:
+            return None
+        frame = self.convert(raw, out)
+        self.shape = frame.shape
+        return frame
+
+
+class PILCaptureSource(CaptureSource):
+    """Grabs the screen area with Pillow's ImageGrab (original capture path)."""
+
+    def open(self):
+        from PIL import ImageGrab
+        self.image_grab = ImageGrab
+
+    def capture(self):
+        return self.image_grab.grab(bbox=self.bbox)
+
+    def convert(self, raw, out=None):
+        return copy_into(np.asarray(raw.convert('L')), out)
+
+
+class MSSCaptureSource(CaptureSource):
+    """Grabs the screen area with MSS, which uses X11 shared memory on Linux.
+
+    The BGRA pixels are viewed in place and converted straight into the
+    caller's grayscale buffer, without going through a PIL image.
+    """
+
+    def __init__(self, bbox):
+        super().__init__(bbox)
+        left, top, right, bottom = bbox
+        self.monitor = {'left': left, 'top': top, 'width': right - left, 'height': bottom - top}
+        self.sct = None
+
+    def open(self):
+        import mss
+        # MSS handles are bound to the thread that created them
+        self.sct = mss.mss()
+
+    def close(self):
+        if self.sct is not None:
+            self.sct.close()
+            self.sct = None
+
+    def capture(self):
+        return self.sct.grab(self.monitor)
+
+    def convert(self, raw, out=None):
+        bgra = np.frombuffer(raw.raw, dtype=np.uint8).reshape(raw.height, raw.width, 4)
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY, dst=out)
+
+
+class ReplayCaptureSource(CaptureSource):
+    """Replays frames from a video file or a folder of images.
+
+    Useful for benchmarking and testing detection without a live display.
+    If a bbox is given, frames are cropped to it.
+    """
+
+    IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+    def __init__(self, path, bbox=None, loop=False):
+        super().__init__(bbox)
+        self.path = path
+        self.loop = loop
+        self.video = None
+        self.images = None
+        self.index = 0
+        self.raw = None
+
+    def open(self):
+        if os.path.isdir(self.path):
+            self.images = sorted(
+                os.path.join(self.path, name) for name in os.listdir(self.path)
+                if name.lower().endswith(self.IMAGE_EXTENSIONS)
+            )
+            self.index = 0
+        else:
+            self.video = cv2.VideoCapture(self.path)
+            if not self.video.isOpened():
+                raise IOError(f"Unable to open replay file: {self.path}")
+
+    def close(self):
+        if self.video is not None:
+            self.video.release()
+            self.video = None
+
+    def frame_count(self):
+        """Number of frames, as reported by the container for videos (may be approximate)."""
+        if self.images is not None:
+            return len(self.images)
+        return max(0, int(self.video.get(cv2.CAP_PROP_FRAME_COUNT)))
+
+    def frame_rate(self):
+        """Frame rate of a video, None for image folders or when unknown."""
+        if self.video is None:
+            return None
+        fps = self.video.get(cv2.CAP_PROP_FPS)
+        return fps if fps > 0 else None
+
+    def seek(self, index):
+        """Moves to frame 'index', the next capture() returns that frame."""
+        if self.images is not None:
+            self.index = index
+        else:
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, index)
+
+    def capture(self):
+        if self.images is not None:
+            if self.index >= len(self.images):
+                if not self.loop or not self.images:
+                    return None
+                self.index = 0
+            frame = cv2.imread(self.images[self.index])
+            self.index += 1
+        else:
+            # Reuse the decode buffer between reads
+            ok, frame = self.video.read(self.raw)
+            if not ok and self.loop:
+                self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = self.video.read(self.raw)
+            if not ok:
+                return None
+            self.raw = frame
+        if frame is not None and self.bbox is not None:
+            left, top, right, bottom = self.bbox
+            frame = frame[top:bottom, left:right]
+        return frame
+
+    def convert(self, raw, out=None):
+        if raw.ndim == 2:
+            return copy_into(raw, out)
+        return cv2.cvtColor(raw, cv2.COLOR_BGR2GRAY, dst=out)
+
+
+def create_capture_source(backend, bbox=None, replay_path='', replay_loop=False):
+    """Creates the capture source for the configured backend name."""
+    if backend == 'replay':
+        return ReplayCaptureSource(replay_path, bbox, loop=replay_loop)
+    if backend == 'mss':
+        try:
+            import mss  # noqa: F401 (optional dependency)
+            return MSSCaptureSource(bbox)
+        except ImportError:
+            print("MSS is not installed, falling back to the PIL capture backend.")
+    elif backend != 'pil':
+        print(f"Unknown capture backend '{backend}', using PIL.")
+    return PILCaptureSource(bbox)
+
+
+class FrameDiffEngine:
+    """Frame differencing kernel for one region, working on a preallocated mask.
+
+    The caller owns the frame buffers (MotionDetector keeps two ping-pong
+    frames) and passes views of the previous and current frame to compare().
+    absdiff and threshold write into a scratch mask and changed pixels are
+    counted with countNonZero, so the steady state does not allocate any
+    frame-sized array.
+    """
+
+    def __init__(self, shape, pixel_threshold=25):
+        self.shape = tuple(shape)
+        self.size = self.shape[0] * self.shape[1]
+        self.pixel_threshold = pixel_threshold
+        self.mask = np.empty(self.shape, dtype=np.uint8)
+        self.changed_pixels = 0
+
+    def reset(self, frame):
+        """Primes the engine with the first frame, for engines keeping per-frame state."""
+
+    def compare(self, prev, curr, limit=None):
+        """Returns the number of pixels that changed by more than the pixel threshold.
+
+        'limit' lets subclasses stop counting once the result is known to exceed it.
+        """
+        cv2.absdiff(prev, curr, dst=self.mask)
+        cv2.threshold(self.mask, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self.mask)
+        self.changed_pixels = cv2.countNonZero(self.mask)
+        return self.changed_pixels
+
+    def motion_mask(self, prev, curr):
+        """Returns the mask of changed pixels of the last comparison of 'prev' and 'curr'."""
+        return self.mask
+
+    def exact_count(self, prev, curr):
+        """Returns the exact changed pixel count of the last comparison of 'prev' and 'curr'.
+
+        compare() may stop at the limit or only estimate; this completes the
+        count, and is only called for regions with motion.
+        """
+        return self.changed_pixels
+
+    def motion_limit(self, sensitivity):
+        """Largest changed pixel count that does not count as motion.
+
+        'changed > limit' is the integer form of the former
+        'np.sum(diff_thresh) / size > (100 - sensitivity) * 255 / 100' test.
+        """
+        return (100 - sensitivity) * self.size // 100
+
+    def motion_score(self, changed):
+        """Percentage of changed pixels."""
+        return changed * 100 / self.size
+
+
+class TiledDiffEngine(FrameDiffEngine):
+    """Frame differencing that skips tiles whose fingerprint did not change.
+
+    The frame is split into a grid of 'tile_size' pixel tiles. Each frame is
+    fingerprinted by sampling every 'sample_step' pixel into a small buffer,
+    and a tile is dirty when one of its samples changed by more than the pixel
+    threshold. Only dirty tiles get the full absdiff/threshold/count pass and
+    counting stops once 'limit' is exceeded. Changes that fall between sample
+    points are not seen, so this engine can miss small motion and is only
+    used when a tile size is configured; a 'sample_step' of 1 makes the
+    fingerprint exact.
+
+    After each comparison 'dirty_tiles' holds the (x, y, width, height) of
+    every dirty tile.
+    """
+
+    def __init__(self, shape, pixel_threshold=25, tile_size=64, sample_step=4):
+        super().__init__(shape, pixel_threshold)
+        self.sample_step = max(1, sample_step)
+        # Tiles are a whole number of samples wide
+        self.tile_size = max(self.sample_step, tile_size - tile_size % self.sample_step)
+        height, width = self.shape
+        samples_per_tile = self.tile_size // self.sample_step
+        self.sample_shape = (-(-height // self.sample_step), -(-width // self.sample_step))
+        self.grid_shape = (-(-self.sample_shape[0] // samples_per_tile), -(-self.sample_shape[1] // samples_per_tile))
+        padded_shape = (self.grid_shape[0] * samples_per_tile, self.grid_shape[1] * samples_per_tile)
+
+        # Padding stays zero so it never marks a tile dirty
+        self.samples = [np.zeros(padded_shape, dtype=np.uint8), np.zeros(padded_shape, dtype=np.uint8)]
+        self.sample_mask = np.zeros(padded_shape, dtype=np.uint8)
+        self.sample_blocks = self.sample_mask.reshape(self.grid_shape[0], samples_per_tile, self.grid_shape[1], samples_per_tile)
+        self.tile_mask = np.zeros(self.grid_shape, dtype=np.uint8)
+        self.tile_rects = [
+            [(col * self.tile_size, row * self.tile_size,
+              min(self.tile_size, width - col * self.tile_size), min(self.tile_size, height - row * self.tile_size))
+             for col in range(self.grid_shape[1])]
+            for row in range(self.grid_shape[0])
+        ]
+        self.dirty_tiles = []
+        self.exact = True  # 'changed_pixels' covers every dirty tile
+        self.mask_complete = False  # 'mask' is valid over the whole frame
+
+    def sample(self, frame, out):
+        """Writes the sampled fingerprint of a frame into 'out'."""
+        rows, cols = self.sample_shape
+        np.copyto(out[:rows, :cols], frame[::self.sample_step, ::self.sample_step])
+
+    def reset(self, frame):
+        super().reset(frame)
+        self.sample(frame, self.samples[0])
+
+    def compare(self, prev, curr, limit=None):
+        """Counts changed pixels in dirty tiles only.
+
+        'prev' must be the frame given as 'curr' on the previous call (or to reset()).
+        """
+        self.sample(curr, self.samples[1])
+        cv2.absdiff(self.samples[0], self.samples[1], dst=self.sample_mask)
+        cv2.threshold(self.sample_mask, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self.sample_mask)
+        self.samples.reverse()
+        np.max(self.sample_blocks, axis=(1, 3), out=self.tile_mask)
+
+        self.changed_pixels = 0
+        self.exact = True
+        self.mask_complete = False
+        if not self.tile_mask.any():
+            # Static screen, nothing else to do
+            self.dirty_tiles = []
+            return 0
+
+        self.dirty_tiles = [self.tile_rects[row][col] for row, col in zip(*np.nonzero(self.tile_mask))]
+        for x, y, w, h in self.dirty_tiles:
+            mask = self.mask[y:y + h, x:x + w]
+            cv2.absdiff(prev[y:y + h, x:x + w], curr[y:y + h, x:x + w], dst=mask)
+            cv2.threshold(mask, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=mask)
+            self.changed_pixels += cv2.countNonZero(mask)
+            # Early exit, the motion decision cannot change anymore
+            if limit is not None and self.changed_pixels > limit:
+                self.exact = False
+                break
+        return self.changed_pixels
+
+    def motion_mask(self, prev, curr):
+        """Completes the mask over every dirty tile, clean tiles are cleared.
+
+        compare() stops early and leaves stale data in clean tiles, so the
+        mask is rebuilt here, only for frames that need it.
+        """
+        if not self.mask_complete:
+            self.mask.fill(0)
+            for x, y, w, h in self.dirty_tiles:
+                mask = self.mask[y:y + h, x:x + w]
+                cv2.absdiff(prev[y:y + h, x:x + w], curr[y:y + h, x:x + w], dst=mask)
+                cv2.threshold(mask, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=mask)
+            self.mask_complete = True
+        return self.mask
+
+    def exact_count(self, prev, curr):
+        """Counts the changed pixels over every dirty tile when compare() exited early."""
+        if not self.exact:
+            self.changed_pixels = cv2.countNonZero(self.motion_mask(prev, curr))
+            self.exact = True
+        return self.changed_pixels
+
+
+class PyramidDiffEngine(FrameDiffEngine):
+    """Frame differencing that scores a downscaled frame first.
+
+    Frames are sampled every 'factor' pixel in both directions, and the
+    changed pixel count is estimated from the diff of the samples, which
+    touches about 1/factor^2 of the pixels. Only when the estimate is
+    within 'margin' percent of the region of the motion limit is the frame
+    compared at full resolution, so the motion decision is exact near the
+    threshold and clear-cut frames skip the full resolution pass.
+    motion_mask() computes the full resolution mask when it was skipped.
+
+    Like TiledDiffEngine, 'prev' must be the frame given as 'curr' on the
+    previous call (or to reset()). 'escalations' counts the full resolution
+    comparisons out of 'comparisons'.
+    """
+
+    def __init__(self, shape, pixel_threshold=25, factor=4, margin=2.0):
+        super().__init__(shape, pixel_threshold)
+        self.factor = max(2, factor)
+        height, width = self.shape
+        self.coarse_shape = (-(-height // self.factor), -(-width // self.factor))
+        self.coarse_size = self.coarse_shape[0] * self.coarse_shape[1]
+        self.coarse = [np.zeros(self.coarse_shape, dtype=np.uint8), np.zeros(self.coarse_shape, dtype=np.uint8)]
+        self.coarse_mask = np.empty(self.coarse_shape, dtype=np.uint8)
+        self.margin = margin * self.size / 100  # In pixels
+        self.escalated = False  # True when 'mask' matches the last comparison
+        self.comparisons = 0
+        self.escalations = 0
+
+    def downsample(self, frame, out):
+        # Strided sampling, area averaging costs as much as the full diff
+        np.copyto(out, frame[::self.factor, ::self.factor])
+
+    def reset(self, frame):
+        super().reset(frame)
+        self.downsample(frame, self.coarse[0])
+
+    def compare(self, prev, curr, limit=None):
+        """Returns the coarse estimate, or the exact count near 'limit' (always without a limit)."""
+        self.downsample(curr, self.coarse[1])
+        cv2.absdiff(self.coarse[0], self.coarse[1], dst=self.coarse_mask)
+        cv2.threshold(self.coarse_mask, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self.coarse_mask)
+        self.coarse.reverse()
+        self.comparisons += 1
+
+        estimate = cv2.countNonZero(self.coarse_mask) * self.size // self.coarse_size
+        if limit is None or abs(estimate - limit) <= self.margin:
+            self.escalations += 1
+            self.escalated = True
+            return super().compare(prev, curr, limit)
+        self.escalated = False
+        self.changed_pixels = estimate
+        return estimate
+
+    def motion_mask(self, prev, curr):
+        if not self.escalated:
+            cv2.absdiff(prev, curr, dst=self.mask)
+            cv2.threshold(self.mask, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self.mask)
+            self.escalated = True
+        return self.mask
+
+    def exact_count(self, prev, curr):
+        """Replaces the coarse estimate with the full resolution count."""
+        if not self.escalated:
+            self.changed_pixels = cv2.countNonZero(self.motion_mask(prev, curr))
+        return self.changed_pixels
+
+
+class MotionLocalizer:
+    """Finds where motion happened in a mask of changed pixels.
+
+    The mask is downscaled by 'scale' (a cell is set when any of its pixels
+    changed) and split into connected components. Each blob larger than
+    'min_area' pixels is returned as (x, y, width, height, area, centroid_x,
+    centroid_y) in region coordinates, largest first and at most 'max_blobs'.
+    Sizes are approximate to the downscaled grid. Only run on frames with
+    motion, so idle frames cost nothing more.
+    """
+
+    def __init__(self, scale=0.25, min_area=25, max_blobs=10):
+        self.scale = min(1.0, max(0.01, scale))
+        self.min_area = min_area
+        self.max_blobs = max_blobs
+
+    def locate(self, mask):
+        scale = self.scale
+        if scale < 1:
+            mask = cv2.resize(mask, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            cv2.threshold(mask, 0, 255, cv2.THRESH_BINARY, dst=mask)
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        blobs = []
+        for label in range(1, count):  # Label 0 is the background
+            x, y, w, h, area = (int(value) for value in stats[label])
+            area = round(area / (scale * scale))
+            if area < self.min_area:
+                continue
+            cx, cy = (float(value) for value in centroids[label])
+            blobs.append((
+                int(x / scale), int(y / scale), round(w / scale), round(h / scale), area,
+                round((cx + 0.5) / scale - 0.5, 1), round((cy + 0.5) / scale - 0.5, 1),
+            ))
+        blobs.sort(key=lambda blob: blob[4], reverse=True)
+        return blobs[:self.max_blobs]
+
+
+def describe_motion(region):
+    """Region name with a short summary of its blobs, used in alerts."""
+    if not region.blobs:
+        return region.name
+    x, y, w, h = region.blobs[0][:4]
+    count = len(region.blobs)
+    return f"{region.name} ({count} blob{'s' if count > 1 else ''}, largest {w}x{h} at {x},{y})"
+
+
+def dirty_summary(engine, prev, curr):
+    """Returns the dirty tile count and their bounding box (left, top, right, bottom), or None.
+
+    Engines without tiles get a count of None and the bounding box of the
+    changed pixels, taken from the motion mask (only called on motion).
+    """
+    if not isinstance(engine, TiledDiffEngine):
+        x, y, w, h = cv2.boundingRect(engine.motion_mask(prev, curr))
+        return (None, (x, y, x + w, y + h)) if w and h else None
+    tiles = engine.dirty_tiles
+    if not tiles:
+        return None
+    return (
+        len(tiles),
+        (min(x for x, y, w, h in tiles), min(y for x, y, w, h in tiles),
+         max(x + w for x, y, w, h in tiles), max(y + h for x, y, w, h in tiles)),
+    )
+
+
+def create_diff_engine(shape, tile_size=0, sample_step=4, pyramid=0, pyramid_margin=2.0):
+    """Creates the diff engine for the detection settings.
+
+    A pyramid factor above 1 selects PyramidDiffEngine, otherwise a tile size
+    selects TiledDiffEngine and 0 the full-frame engine.
+    """
+    if pyramid > 1:
+        return PyramidDiffEngine(shape, factor=pyramid, margin=pyramid_margin)
+    if tile_size > 0:
+        return TiledDiffEngine(shape, tile_size=tile_size, sample_step=sample_step)
+    return FrameDiffEngine(shape)
+
+
+class FrameScheduler:
+    """Paces the detection loop on absolute deadlines.
+
+    Frames are due every 1 / 'target_fps' seconds while motion is active. Once
+    the region goes idle the period ramps linearly to 1 / 'idle_fps' over
+    'idle_backoff' seconds, and snaps back to the target rate on motion.
+    Deadlines are absolute so processing time does not make the rate drift.
+    A frame that starts after its deadline counts as missed, and the schedule
+    restarts from the current time instead of bursting to catch up.
+    """
+
+    def __init__(self, target_fps=10, idle_fps=5, idle_backoff=5):
+        self.active_period = 1 / target_fps
+        self.idle_period = max(self.active_period, 1 / idle_fps)
+        self.idle_backoff = idle_backoff
+        self.period = self.active_period
+        self.deadline = None
+        self.idle_since = None
+        self.missed_deadlines = 0
+        self.lag = 0.0  # How late the last frame started, in seconds
+
+    def set_active(self, active):
+        """Selects the frame period from the current motion state."""
+        now = time.monotonic()
+        if active:
+            self.idle_since = None
+            self.period = self.active_period
+            return
+        if self.idle_since is None:
+            self.idle_since = now
+        ramp = min(1.0, (now - self.idle_since) / self.idle_backoff) if self.idle_backoff > 0 else 1.0
+        self.period = self.active_period + (self.idle_period - self.active_period) * ramp
+
+    def wait(self):
+        """Sleeps until the next frame is due, returns False if the deadline was missed."""
+        now = time.monotonic()
+        if self.deadline is None:
+            self.deadline = now
+        self.deadline += self.period
+        delay = self.deadline - now
+        if delay > 0:
+            self.lag = 0.0
+            time.sleep(delay)
+            return True
+        self.lag = -delay
+        self.missed_deadlines += 1
+        self.deadline = now
+        return False
+
+
+class MonitoredRegion:
+    """A named screen area watched for motion with its own sensitivity and cooldown."""
+
+    def __init__(self, name, bbox, sensitivity=50, cooldown_time=10):
+        self.name = name
+        self.bbox = bbox
+        self.sensitivity = sensitivity
+        self.cooldown_time = cooldown_time
+        self.motion_detected_time = None
+        self.engine = None
+        self.view = None  # Slices of the shared frame covered by the region
+        self.recorder = None
+        self.changed_pixels = 0
+        self.score = 0.0  # Percentage of changed pixels
+        self.dirty_area = None  # (dirty tile count, bounding box) of the last comparison
+        self.blobs = []  # Motion blobs found by the localizer, see MotionLocalizer
+        self.motion = False
+
+    def is_active(self, now):
+        """True while motion was detected within the cooldown time."""
+        return bool(self.motion_detected_time and now - self.motion_detected_time < self.cooldown_time)
+
+
+def union_bbox(bboxes):
+    """Returns the bounding box enclosing all the given boxes."""
+    return (min(b[0] for b in bboxes), min(b[1] for b in bboxes), max(b[2] for b in bboxes), max(b[3] for b in bboxes))
+
+
+def assign_region_views(regions, capture_bbox, shape):
+    """Sets each region's view, the slices of the captured frame it covers.
+
+    Region boxes are screen coordinates, views are relative to the captured
+    area and clipped to it. Regions without a bbox cover the whole frame.
+    """
+    height, width = shape
+    origin_x, origin_y = capture_bbox[:2] if capture_bbox else (0, 0)
+    for region in regions:
+        if region.bbox is None:
+            left, top, right, bottom = 0, 0, width, height
+        else:
+            left = min(max(region.bbox[0] - origin_x, 0), width)
+            top = min(max(region.bbox[1] - origin_y, 0), height)
+            right = min(max(region.bbox[2] - origin_x, left + 1), width)
+            bottom = min(max(region.bbox[3] - origin_y, top + 1), height)
+        region.view = (slice(top, bottom), slice(left, right))
+
+
+class FrameRingBuffer:
+    """Memory-bounded ring of the most recent frames of a region.
+
+    Frames are downscaled by 'scale' and kept as uint8 arrays in one
+    preallocated block, or JPEG-compressed when 'jpeg_quality' is set. The
+    ring holds at most 'capacity' frames and no more than 'max_bytes' (the
+    newest frame is always kept).
+    """
+
+    def __init__(self, shape, capacity, max_bytes, scale=1.0, jpeg_quality=0):
+        height, width = shape
+        self.shape = (max(1, int(height * scale)), max(1, int(width * scale)))
+        self.jpeg_quality = jpeg_quality
+        self.max_bytes = max_bytes
+        frame_bytes = self.shape[0] * self.shape[1]
+        self.capacity = max(1, capacity if jpeg_quality else min(capacity, max_bytes // frame_bytes))
+        self.timestamps = np.zeros(self.capacity)
+        self.count = 0
+        if jpeg_quality:
+            self.frames = [None] * self.capacity
+            self.sizes = [0] * self.capacity
+            self.total_bytes = 0
+            self.scratch = np.empty(self.shape, dtype=np.uint8)
+        else:
+            self.frames = np.empty((self.capacity,) + self.shape, dtype=np.uint8)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def downscale(self, frame, out):
+        if frame.shape == self.shape:
+            np.copyto(out, frame)
+        else:
+            cv2.resize(frame, (self.shape[1], self.shape[0]), dst=out, interpolation=cv2.INTER_AREA)
+        return out
+
+    def push(self, frame, timestamp):
+        slot = self.count % self.capacity
+        self.timestamps[slot] = timestamp
+        self.count += 1
+        if not self.jpeg_quality:
+            self.downscale(frame, self.frames[slot])
+            return
+
+        ok, encoded = cv2.imencode('.jpg', self.downscale(frame, self.scratch), [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        self.total_bytes += encoded.nbytes - self.sizes[slot]
+        self.frames[slot] = encoded
+        self.sizes[slot] = encoded.nbytes
+        # Drop the oldest frames while over budget
+        oldest = self.count - len(self)
+        while self.total_bytes > self.max_bytes and oldest < self.count - 1:
+            old_slot = oldest % self.capacity
+            self.total_bytes -= self.sizes[old_slot]
+            self.frames[old_slot] = None
+            self.sizes[old_slot] = 0
+            oldest += 1
+
+    def snapshot(self, since=0.0):
+        """Returns (timestamps, frames) of the buffered frames newer than 'since', oldest first.
+
+        Raw frames are copied, JPEG frames are immutable and shared.
+        """
+        order = [index % self.capacity for index in range(self.count - len(self), self.count)]
+        order = [slot for slot in order if self.timestamps[slot] >= since and (not self.jpeg_quality or self.frames[slot] is not None)]
+        timestamps = self.timestamps[order].tolist()
+        if self.jpeg_quality:
+            return timestamps, [self.frames[slot] for slot in order]
+        return timestamps, self.frames[order]
+
+
+class ClipWriter:
+    """Encodes motion clips to disk from a background thread.
+
+    Clips are written as an MP4 video ('video') or a folder of JPEG images
+    ('images'). submit() never blocks, the capture loop hands the frames over
+    and continues.
+    """
+
+    def __init__(self, output_dir="clips", clip_format="video", metrics=None):
+        self.output_dir = output_dir
+        self.clip_format = clip_format
+        self.metrics = metrics
+        self.queue = queue.Queue()
+        self.thread = None
+        if metrics is not None:
+            metrics.register_gauge('queue_depth', self.queue.qsize, queue='clips')
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True, name="clip-writer")
+        self.thread.start()
+
+    def stop(self):
+        """Writes the pending clips, then stops the thread."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.metrics is not None:
+            self.metrics.unregister_gauge('queue_depth', self.queue.qsize, queue='clips')
+
+    def submit(self, name, timestamps, frames, jpeg, done=None):
+        self.queue.put((name, timestamps, frames, jpeg, done))
+
+    def run(self):
+        while True:
+            clip = self.queue.get()
+            if clip is None:
+                break
+            name, timestamps, frames, jpeg, done = clip
+            try:
+                path = self.write(name, timestamps, frames, jpeg)
+                print(f"Saved motion clip {path}")
+                if self.metrics is not None:
+                    self.metrics.inc('clips_written_total')
+            except Exception as e:
+                print(f"Error writing motion clip: {e}")
+            finally:
+                if done is not None:
+                    done()
+
+    def write(self, name, timestamps, frames, jpeg):
+        safe_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(timestamps[0])) + f"-{int(timestamps[0] * 1000) % 1000:03d}"
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{safe_name}_{stamp}")
+
+        if self.clip_format == 'images':
+            os.makedirs(path, exist_ok=True)
+            for index, frame in enumerate(frames):
+                frame_path = os.path.join(path, f"frame_{index:05d}.{'jpg' if jpeg else 'png'}")
+                if jpeg:
+                    with open(frame_path, 'wb') as frame_file:
+                        frame_file.write(frame.tobytes())
+                else:
+                    cv2.imwrite(frame_path, frame)
+            return path
+
+        # Play the clip back at the rate it was captured
+        duration = timestamps[-1] - timestamps[0]
+        fps = (len(timestamps) - 1) / duration if duration > 0 else 10
+        path += ".mp4"
+        writer = None
+        try:
+            for frame in frames:
+                if jpeg:
+                    frame = cv2.imdecode(frame, cv2.IMREAD_GRAYSCALE)
+                if writer is None:
+                    height, width = frame.shape
+                    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height), isColor=False)
+                writer.write(frame)
+        finally:
+            if writer is not None:
+                writer.release()
+        return path
+
+
+class ClipRecorder:
+    """Keeps the last seconds of a region and saves a clip around each motion event.
+
+    On a trigger, frames keep being buffered for 'post_seconds', then the
+    pre-roll and post-roll are handed to the ClipWriter. Half of 'max_bytes'
+    goes to the ring and the other half is the budget of the one clip that
+    can wait for the writer, so a region never uses more than 'max_bytes'.
+    Triggers while a clip is recorded or waiting are part of that clip or
+    skipped.
+    """
+
+    def __init__(self, name, shape, writer, pre_seconds=5, post_seconds=5, fps=10, max_bytes=64 * 2 ** 20,
+                 scale=0.5, jpeg_quality=0, metrics=None):
+        self.name = name
+        self.writer = writer
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.metrics = metrics
+        capacity = int((pre_seconds + post_seconds) * fps) + 1
+        self.ring = FrameRingBuffer(shape, capacity, max_bytes // 2, scale, jpeg_quality)
+        self.trigger_time = None
+        self.pending = False  # A clip is waiting for the writer
+
+    def push(self, frame, now):
+        self.ring.push(frame, now)
+        if self.trigger_time is not None and now - self.trigger_time >= self.post_seconds:
+            self.flush()
+
+    def trigger(self, now):
+        if self.trigger_time is not None:
+            return
+        if self.pending:
+            if self.metrics is not None:
+                self.metrics.inc('clips_dropped_total')
+            return
+        self.trigger_time = now
+
+    def flush(self):
+        """Hands the current clip to the writer, if one is being recorded."""
+        if self.trigger_time is None:
+            return
+        timestamps, frames = self.ring.snapshot(self.trigger_time - self.pre_seconds)
+        self.trigger_time = None
+        if timestamps:
+            self.pending = True
+            self.writer.submit(self.name, timestamps, frames, bool(self.ring.jpeg_quality), self.clip_done)
+
+    def clip_done(self):
+        self.pending = False
+
+
+class MotionDetector:
+    """Detection pipeline shared by all monitored regions, independent of the GUI.
+
+    Each tick grabs the union bounding box of the regions once into one of two
+    ping-pong buffers, then every region is scored on a NumPy view of it. With
+    several regions the scoring is spread over a thread pool, OpenCV releases
+    the GIL so the regions are diffed in parallel.
+
+    'on_motion' is called with the triggered regions. The duration of each
+    stage of the last step is kept in 'stage_times' (seconds), and recorded
+    in 'metrics' when a registry is given.
+
+    With a 'recorder_factory(region, shape)', each region gets a ClipRecorder
+    fed with its frames, and 'clip_writer' is stopped on close().
+
+    With a 'localizer' (MotionLocalizer), triggered regions also get the
+    blobs of changed pixels in 'blobs'.
+    """
+
+    STAGES = ('capture', 'convert', 'diff', 'dispatch', 'record')
+
+    def __init__(self, source, regions, tile_size=0, sample_step=4, max_workers=0, on_motion=None, metrics=None,
+                 recorder_factory=None, clip_writer=None, localizer=None, pyramid=0, pyramid_margin=2.0):
+        self.source = source
+        self.regions = regions
+        self.localizer = localizer
+        self.pyramid = pyramid
+        self.pyramid_margin = pyramid_margin
+        self.on_motion = on_motion
+        self.metrics = metrics
+        self.recorder_factory = recorder_factory
+        self.clip_writer = clip_writer
+        self.recorders = []
+        self.stage_times = dict.fromkeys(self.STAGES, 0.0)
+        self.tile_size = tile_size
+        self.sample_step = sample_step
+        self.max_workers = max_workers or min(len(regions), os.cpu_count() or 1)
+        self.frames = None
+        self.pool = None
+
+    def start(self):
+        """Opens the source and primes every region, returns False if no frame is available."""
+        self.source.open()
+        first_frame = self.source.read()
+        if first_frame is None:
+            return False
+        self.frames = [first_frame, np.empty_like(first_frame)]
+
+        assign_region_views(self.regions, self.source.bbox, first_frame.shape)
+        for region in self.regions:
+            region_shape = first_frame[region.view].shape
+            region.engine = create_diff_engine(region_shape, self.tile_size, self.sample_step, self.pyramid,
+                                               self.pyramid_margin)
+            region.engine.reset(first_frame[region.view])
+            if self.recorder_factory is not None:
+                region.recorder = self.recorder_factory(region, region_shape)
+                self.recorders.append(region.recorder)
+
+        if len(self.regions) > 1 and self.max_workers > 1:
+            self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="region-scoring")
+        return True
+
+    def score_region(self, region, prev, curr):
+        """Diffs one region of the current frame against the previous one."""
+        engine = region.engine
+        limit = engine.motion_limit(region.sensitivity)
+        region.changed_pixels = engine.compare(prev[region.view], curr[region.view], limit)
+        region.motion = region.changed_pixels > limit
+        if region.motion:
+            # Journal and alerts get the exact count, not the early-exit bound or the estimate
+            region.changed_pixels = engine.exact_count(prev[region.view], curr[region.view])
+            region.score = engine.motion_score(region.changed_pixels)
+            region.dirty_area = dirty_summary(engine, prev[region.view], curr[region.view])
+            if self.localizer is not None:
+                region.blobs = self.localizer.locate(engine.motion_mask(prev[region.view], curr[region.view]))
+
+    def step(self):
+        """Processes one frame.
+
+        Returns the regions where motion was detected, or None once the
+        source is exhausted.
+        """
+        times = self.stage_times
+        start = time.perf_counter()
+        raw = self.source.capture()
+        if raw is None:
+            return None
+        captured = time.perf_counter()
+        curr = self.source.convert(raw, self.frames[1])
+        converted = time.perf_counter()
+        times['capture'] = captured - start
+        times['convert'] = converted - captured
+        if curr is not self.frames[1]:
+            print("Error: Frame sizes do not match!")
+            if self.metrics is not None:
+                self.metrics.inc('frames_mismatched_total')
+            return []
+
+        prev = self.frames[0]
+        if self.pool is not None:
+            list(self.pool.map(lambda region: self.score_region(region, prev, curr), self.regions))
+        else:
+            for region in self.regions:
+                self.score_region(region, prev, curr)
+        self.frames.reverse()
+        diffed = time.perf_counter()
+
+        now = time.time()
+        triggered = [region for region in self.regions if region.motion]
+        for region in triggered:
+            region.motion_detected_time = now
+        if triggered and self.on_motion is not None:
+            self.on_motion(triggered)
+        dispatched = time.perf_counter()
+
+        # Buffer the frames for the motion clips, writing happens in the background
+        if self.recorders:
+            for region in self.regions:
+                if region.recorder is not None:
+                    if region.motion:
+                        region.recorder.trigger(now)
+                    region.recorder.push(curr[region.view], now)
+        times['diff'] = diffed - converted
+        times['dispatch'] = dispatched - diffed
+        times['record'] = time.perf_counter() - dispatched
+
+        if self.metrics is not None:
+            self.metrics.inc('frames_total')
+            for stage, value in times.items():
+                self.metrics.observe('stage_seconds', value, stage=stage)
+            for region in triggered:
+                self.metrics.inc('motion_events_total', region=region.name)
+        return triggered
+
+    def is_active(self):
+        """True while any region is within its motion cooldown."""
+        now = time.time()
+        return any(region.is_active(now) for region in self.regions)
+
+    def latest_frame(self):
+        """Returns the most recent captured frame."""
+        return self.frames[0]
+
+    def set_frame_period(self, period):
+        """Capture is paced by the caller's loop, nothing to do."""
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+        self.source.close()
+        # Save the clips being recorded
+        for recorder in self.recorders:
+            recorder.flush()
+        self.recorders = []
+        if self.clip_writer is not None:
+            self.clip_writer.stop()
+
+
+def capture_process(source_spec, shm_name, shape, slots, seqs, frame_queues, period, stop_event):
+    """Worker process grabbing frames into the shared memory ring.
+
+    Each frame is written into the next slot, the slot's sequence number is
+    set once the frame is complete (-1 while it is written), and a small
+    (seq, slot, time, capture, convert) record is sent to every scoring
+    worker. The controller sets the frame period in 'period'.
+    """
+    # Spawned workers share the controller's resource tracker, which unlinks the block
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = np.ndarray((slots,) + tuple(shape), dtype=np.uint8, buffer=shm.buf)
+    source = create_capture_source(*source_spec)
+    scheduler = FrameScheduler()
+    seq = 0
+    try:
+        source.open()
+        while not stop_event.is_set():
+            slot = seq % slots
+            seqs[slot] = -1
+            start = time.perf_counter()
+            raw = source.capture()
+            if raw is None:
+                break
+            captured = time.perf_counter()
+            target = ring[slot]
+            frame = source.convert(raw, target)
+            converted = time.perf_counter()
+            if frame is target:
+                seqs[slot] = seq
+                record = (seq, slot, time.time(), captured - start, converted - captured)
+                for frame_queue in frame_queues:
+                    frame_queue.put(record)
+                seq += 1
+            else:
+                print("Error: Frame sizes do not match!")
+            scheduler.period = period.value
+            scheduler.wait()
+    except Exception as e:
+        print(f"Error during capture: {e}")
+    finally:
+        source.close()
+        for frame_queue in frame_queues:
+            frame_queue.put(None)
+        # Views on the block must be gone before it can be closed
+        target = frame = ring = None
+        shm.close()
+
+
+def scoring_process(worker, shm_name, shape, slots, seqs, frame_queue, events, region_views, sensitivities, tile_size,
+                    sample_step, localizer=None, pyramid=0, pyramid_margin=2.0):
+    """Worker process scoring a group of regions on the shared memory frames.
+
+    Region views are first copied out of the shared slot and the slot's
+    sequence number is checked afterwards, so a slot overwritten during the
+    copy is detected and the frame dropped. When the worker falls behind it
+    skips to the newest frame. Only an event record per frame, with the
+    worker index and the regions where motion was found, goes back to the
+    controller.
+    """
+    # Spawned workers share the controller's resource tracker, which unlinks the block
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = np.ndarray((slots,) + tuple(shape), dtype=np.uint8, buffer=shm.buf)
+    states = []
+    for index, view in region_views:
+        region_shape = ring[0][view].shape
+        states.append({
+            'index': index,
+            'view': view,
+            'engine': create_diff_engine(region_shape, tile_size, sample_step, pyramid, pyramid_margin),
+            'frames': [np.empty(region_shape, dtype=np.uint8), np.empty(region_shape, dtype=np.uint8)],
+            'primed': False,
+        })
+
+    try:
+        while True:
+            record = frame_queue.get()
+            dropped = 0
+            while record is not None:
+                try:
+                    newer = frame_queue.get_nowait()
+                except queue.Empty:
+                    break
+                record, dropped = newer, dropped + 1
+            if record is None:
+                break
+
+            seq, slot, timestamp, capture_time, convert_time = record
+            start = time.perf_counter()
+            frame = ring[slot]
+            for state in states:
+                np.copyto(state['frames'][1], frame[state['view']])
+            if seqs[slot] != seq:
+                # Overwritten while copying, start over from the next frame
+                for state in states:
+                    state['primed'] = False
+                events.put(('frame', worker, seq, timestamp, capture_time, convert_time, 0.0, dropped + 1, []))
+                continue
+
+            motion = []
+            for state in states:
+                prev, curr = state['frames']
+                engine = state['engine']
+                if state['primed']:
+                    limit = engine.motion_limit(sensitivities[state['index']])
+                    changed = engine.compare(prev, curr, limit)
+                    if changed > limit:
+                        changed = engine.exact_count(prev, curr)
+                        blobs = localizer.locate(engine.motion_mask(prev, curr)) if localizer is not None else []
+                        motion.append((state['index'], changed, engine.motion_score(changed),
+                                       dirty_summary(engine, prev, curr), blobs))
+                else:
+                    engine.reset(curr)
+                    state['primed'] = True
+                state['frames'].reverse()
+            events.put(('frame', worker, seq, timestamp, capture_time, convert_time, time.perf_counter() - start, dropped,
+                        motion))
+    except Exception as e:
+        print(f"Error during scoring: {e}")
+    finally:
+        events.put(('end',))
+        frame = ring = None
+        shm.close()
+
+
+class ProcessDetectionEngine:
+    """Detection engine running capture and scoring in worker processes.
+
+    One process captures frames into a ring of shared memory slots, and
+    scoring processes each diff a group of regions on those slots, so
+    detection uses several cores instead of sharing the GIL with the GUI.
+    Frames are never pickled, only small event records come back to this
+    controller, which owns alerts and the UI. It has the same interface as
+    MotionDetector; the capture rate follows set_frame_period().
+    """
+
+    SLOTS = 4
+    SEEN_SEQS = 256  # Workers report a frame within far fewer frames of each other
+    STAGES = MotionDetector.STAGES
+
+    def __init__(self, source_spec, regions, tile_size=0, sample_step=4, workers=0, on_motion=None, metrics=None,
+                 localizer=None, pyramid=0, pyramid_margin=2.0):
+        self.source_spec = source_spec  # create_capture_source() arguments
+        self.regions = regions
+        self.localizer = localizer
+        self.pyramid = pyramid
+        self.pyramid_margin = pyramid_margin
+        self.tile_size = tile_size
+        self.sample_step = sample_step
+        self.workers = min(len(regions), workers or max(1, (os.cpu_count() or 2) - 1))
+        self.on_motion = on_motion
+        self.metrics = metrics
+        self.stage_times = dict.fromkeys(self.STAGES, 0.0)
+        self.processes = []
+        self.shm = None
+        self.ring = None
+        self.running_workers = 0
+        self.seen_seqs = OrderedDict()  # Recent frame sequence numbers, every worker reports each frame
+
+    def start(self):
+        """Starts the worker processes, returns False if the source has no frame."""
+        import multiprocessing
+        from multiprocessing import shared_memory
+
+        # Read one frame here to size the shared memory ring
+        source = create_capture_source(*self.source_spec)
+        try:
+            source.open()
+            first_frame = source.read()
+        finally:
+            source.close()
+        if first_frame is None:
+            return False
+        shape = first_frame.shape
+        assign_region_views(self.regions, source.bbox, shape)
+
+        context = multiprocessing.get_context('spawn')
+        self.shm = shared_memory.SharedMemory(create=True, size=self.SLOTS * first_frame.size)
+        self.ring = np.ndarray((self.SLOTS,) + shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.seqs = context.Array('q', [-1] * self.SLOTS, lock=False)
+        self.period = context.Value('d', 0.1, lock=False)
+        self.sensitivities = context.Array('i', [region.sensitivity for region in self.regions], lock=False)
+        self.stop_event = context.Event()
+        self.events = context.Queue()
+
+        # Regions are dealt round-robin to the scoring workers. The queues are
+        # kept here, Process.start() drops its arguments once the child is spawned
+        self.frame_queues = []
+        for worker in range(self.workers):
+            views = [(index, region.view) for index, region in enumerate(self.regions) if index % self.workers == worker]
+            frame_queue = context.Queue()
+            self.frame_queues.append(frame_queue)
+            self.processes.append(context.Process(
+                target=scoring_process, name=f"motionguard-scoring-{worker}", daemon=True,
+                args=(worker, self.shm.name, shape, self.SLOTS, self.seqs, frame_queue, self.events, views,
+                      self.sensitivities, self.tile_size, self.sample_step, self.localizer,
+                      self.pyramid, self.pyramid_margin),
+            ))
+        self.processes.append(context.Process(
+            target=capture_process, name="motionguard-capture", daemon=True,
+            args=(self.source_spec, self.shm.name, shape, self.SLOTS, self.seqs, self.frame_queues, self.period, self.stop_event),
+        ))
+        for process in self.processes:
+            process.start()
+        self.running_workers = self.workers
+        return True
+
+    def step(self):
+        """Collects the event records received since the last call.
+
+        Returns the regions where motion was detected, or None once the
+        source is exhausted and every worker has finished.
+        """
+        # Pass sensitivity changes (GUI sliders) on to the workers
+        for index, region in enumerate(self.regions):
+            if self.sensitivities[index] != region.sensitivity:
+                self.sensitivities[index] = region.sensitivity
+
+        triggered = {}
+        times = self.stage_times
+        while True:
+            try:
+                record = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if record[0] == 'end':
+                self.running_workers -= 1
+                continue
+            _, worker, seq, timestamp, capture_time, convert_time, times['diff'], dropped, motion = record
+            # Frame and capture metrics once per frame, diff and drops per worker
+            new_frame = seq not in self.seen_seqs
+            if new_frame:
+                self.seen_seqs[seq] = None
+                if len(self.seen_seqs) > self.SEEN_SEQS:
+                    self.seen_seqs.popitem(last=False)
+                times['capture'] = capture_time
+                times['convert'] = convert_time
+            if self.metrics is not None:
+                if new_frame:
+                    self.metrics.inc('frames_total')
+                    self.metrics.observe('stage_seconds', capture_time, stage='capture')
+                    self.metrics.observe('stage_seconds', convert_time, stage='convert')
+                if dropped:
+                    self.metrics.inc('frames_dropped_total', dropped, worker=str(worker))
+                self.metrics.observe('stage_seconds', times['diff'], stage='diff')
+            for index, changed, score, dirty_area, blobs in motion:
+                region = self.regions[index]
+                region.changed_pixels = changed
+                region.score = score
+                region.dirty_area = dirty_area
+                region.blobs = blobs
+                triggered[index] = region
+
+        now = time.time()
+        for index, region in enumerate(self.regions):
+            region.motion = index in triggered
+            if region.motion:
+                region.motion_detected_time = now
+        triggered = list(triggered.values())
+
+        dispatch_start = time.perf_counter()
+        if triggered and self.on_motion is not None:
+            self.on_motion(triggered)
+        times['dispatch'] = time.perf_counter() - dispatch_start
+        if self.metrics is not None:
+            self.metrics.observe('stage_seconds', times['dispatch'], stage='dispatch')
+            for region in triggered:
+                self.metrics.inc('motion_events_total', region=region.name)
+
+        # Also stop if the workers died without reporting the end
+        if not triggered and (self.running_workers <= 0 or not any(process.is_alive() for process in self.processes)):
+            return None
+        return triggered
+
+    def is_active(self):
+        """True while any region is within its motion cooldown."""
+        now = time.time()
+        return any(region.is_active(now) for region in self.regions)
+
+    def latest_frame(self):
+        """Returns a copy of the newest complete frame in the ring."""
+        slot = max(range(self.SLOTS), key=lambda index: self.seqs[index])
+        return self.ring[slot].copy()
+
+    def set_frame_period(self, period):
+        """Sets the capture period of the capture process."""
+        self.period.value = period
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        self.ring = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+
+class EmailDispatcher:
+    """Sends motion alert emails from a background thread.
+
+    The detection loop only calls notify(), which never blocks: events go to a
+    bounded queue and are dropped (and counted) when it is full. The worker
+    keeps one SMTP session open between messages and reconnects when the
+    server drops it. At most one message is sent every 'min_interval'
+    seconds, events arriving in between are coalesced into a digest.
+    """
+
+    def __init__(self, settings, min_interval=30, queue_size=100, idle_timeout=300, metrics=None):
+        self.settings = dict(settings)
+        self.min_interval = min_interval
+        self.idle_timeout = idle_timeout  # Close the session after this long without mail
+        self.metrics = metrics
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.server = None
+        self.settings_changed = False
+        self.last_sent = 0.0
+        self.stop_event = threading.Event()
+        self.thread = None
+        if metrics is not None:
+            metrics.register_gauge('queue_depth', self.queue.qsize, queue='email')
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True, name="email-dispatcher")
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+        self.disconnect()
+        if self.metrics is not None:
+            self.metrics.unregister_gauge('queue_depth', self.queue.qsize, queue='email')
+
+    def update_settings(self, settings):
+        """Uses new SMTP settings, the session is reopened on the next message."""
+        self.settings = dict(settings)
+        self.settings_changed = True
+
+    def notify(self, region_names):
+        """Queues a motion event without blocking, returns False if the queue is full."""
+        try:
+            self.queue.put_nowait((time.time(), region_names))
+            return True
+        except queue.Full:
+            if self.metrics is not None:
+                self.metrics.inc('emails_dropped_total')
+            return False
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                event = self.queue.get(timeout=min(1.0, self.idle_timeout))
+            except queue.Empty:
+                if self.server is not None and time.time() - self.last_sent > self.idle_timeout:
+                    self.disconnect()
+                continue
+
+            # Wait for the rate limit, collecting the events of the burst meanwhile
+            events = [event]
+            send_at = self.last_sent + self.min_interval
+            while not self.stop_event.is_set():
+                remaining = send_at - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    events.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            while True:
+                try:
+                    events.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.send(events)
+
+    def build_message(self, events):
+        """Builds a single alert, or a digest when several events were coalesced."""
+        from email.mime.text import MIMEText
+        settings = self.settings
+        if len(events) == 1:
+            subject = settings['subject']
+            body = settings['body']
+            if events[0][1]:
+                body += "\n\nRegions: " + ", ".join(events[0][1])
+        else:
+            subject = f"{settings['subject']} ({len(events)} events)"
+            lines = [
+                f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}  {', '.join(names)}"
+                for timestamp, names in events
+            ]
+            body = settings['body'] + "\n\n" + "\n".join(lines)
+        msg = MIMEText(body)
+        msg['Subject'] = subject
+        msg['From'] = settings['email']
+        msg['To'] = settings['recipient']
+        return msg
+
+    def connect(self):
+        import smtplib
+        settings = self.settings
+        # Check if port 465 for SSL is being used
+        if settings['port'] == '465':
+            print(f"Connecting to SMTP server {settings['server']} on port {settings['port']} using SSL...")
+            server = smtplib.SMTP_SSL(settings['server'], int(settings['port']), timeout=30)
+        else:
+            print(f"Connecting to SMTP server {settings['server']} on port {settings['port']}...")
+            server = smtplib.SMTP(settings['server'], int(settings['port']), timeout=30)
+            server.ehlo()
+            if settings['port'] == '587':  # Port 587 uses TLS
+                print("Starting TLS...")
+                server.starttls()
+                server.ehlo()  # Re-identify ourselves after starting TLS
+
+        # Local relays may not require authentication
+        if settings['password']:
+            print(f"Logging in as {settings['email']}...")
+            server.login(settings['email'], settings['password'])
+        self.server = server
+
+    def disconnect(self):
+        server, self.server = self.server, None
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                server.close()
+
+    def send(self, events):
+        """Sends the events as one message, reconnecting once if the session dropped."""
+        import smtplib
+        start = time.perf_counter()
+        if self.settings_changed:
+            self.settings_changed = False
+            self.disconnect()
+        msg = self.build_message(events)
+        for attempt in range(2):
+            try:
+                if self.server is None:
+                    self.connect()
+                print("Sending email...")
+                self.server.sendmail(self.settings['email'], [self.settings['recipient']], msg.as_string())
+                print("Email sent successfully.")
+                self.last_sent = time.time()
+                if self.metrics is not None:
+                    self.metrics.inc('emails_sent_total')
+                    self.metrics.inc('email_events_total', len(events))
+                    self.metrics.observe('email_send_seconds', time.perf_counter() - start)
+                    self.metrics.observe('email_delivery_seconds', self.last_sent - events[0][0])
+                return True
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                self.disconnect()
+                if attempt == 0:
+                    print("The server unexpectedly disconnected, reconnecting...")
+                    continue
+                print(f"The server unexpectedly disconnected: {e}")
+            except smtplib.SMTPAuthenticationError:
+                print("Authentication failed: Incorrect username or password.")
+                self.disconnect()
+            except smtplib.SMTPConnectError:
+                print("Connection error: Unable to establish a connection with the server.")
+                self.disconnect()
+            except Exception as e:
+                print(f"Error sending email: {e}")
+                self.disconnect()
+            break
+        # Failed sends also count against the rate limit, so a dead server is not hammered
+        self.last_sent = time.time()
+        if self.metrics is not None:
+            self.metrics.inc('emails_failed_total')
+        return False
+
+
+class SoundPlayer:
+    """Plays alert sounds on a dedicated mixer channel from one long-lived worker.
+
+    Sound files are decoded once into pygame.mixer.Sound objects and kept in a
+    small cache, invalidated when the file changes. play() only queues a
+    request, so callers never wait on disk or decoding. While a sound plays
+    the worker waits on its request queue until the sound's expected end, then
+    confirms with the channel, instead of a polling thread per alert.
+    """
+
+    CACHE_SIZE = 4
+
+    def __init__(self, volume=1.0, metrics=None):
+        self.volume = volume
+        self.metrics = metrics
+        self.cache = OrderedDict()  # Only touched by the worker thread
+        self.requests = queue.SimpleQueue()
+        self.playing = False
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True, name="sound-player")
+        self.thread.start()
+
+    def stop(self):
+        self.requests.put(None)
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def preload(self, sound_file):
+        """Decodes the sound file in the background so the first alert plays immediately."""
+        if sound_file:
+            self.requests.put(('load', sound_file))
+
+    def invalidate(self, sound_file=None):
+        """Drops a cached sound (all of them without argument), e.g. when the file changed."""
+        self.requests.put(('invalidate', sound_file))
+
+    def set_volume(self, volume):
+        self.volume = volume
+        self.requests.put(('volume', volume))
+
+    def play(self, sound_file):
+        """Plays the sound file unless a sound is already playing, returns True if queued."""
+        if self.playing or not sound_file:
+            return False
+        self.playing = True
+        self.requests.put(('play', sound_file))
+        return True
+
+    def get_sound(self, sound_file):
+        sound = self.cache.get(sound_file)
+        if sound is None:
+            sound = pygame.mixer.Sound(sound_file)
+            sound.set_volume(self.volume)
+            self.cache[sound_file] = sound
+            if len(self.cache) > self.CACHE_SIZE:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(sound_file)
+        return sound
+
+    def run(self):
+        audio = load_audio()
+        channel = None
+        if audio is not None:
+            # Reserve channel 0 so nothing else can take it
+            audio.mixer.set_reserved(1)
+            channel = audio.mixer.Channel(0)
+        end_time = None
+
+        while True:
+            timeout = max(0.0, end_time - time.monotonic()) if end_time is not None else None
+            try:
+                request = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                # The sound should be over, allow for mixer latency before calling it done
+                if channel.get_busy():
+                    end_time = time.monotonic() + 0.05
+                else:
+                    end_time = None
+                    self.playing = False
+                continue
+            if request is None:
+                break
+
+            kind, value = request
+            try:
+                if kind == 'invalidate':
+                    if value is None:
+                        self.cache.clear()
+                    else:
+                        self.cache.pop(value, None)
+                elif channel is None:
+                    self.playing = False
+                elif kind == 'load':
+                    self.get_sound(value)
+                elif kind == 'volume':
+                    for sound in self.cache.values():
+                        sound.set_volume(value)
+                elif kind == 'play':
+                    sound = self.get_sound(value)
+                    channel.play(sound)
+                    end_time = time.monotonic() + sound.get_length()
+                    if self.metrics is not None:
+                        self.metrics.inc('sounds_played_total')
+            except Exception as e:
+                print(f"Error playing sound: {e}")
+                if kind == 'play':
+                    self.playing = False
+
+
+class EventJournal:
+    """Appends motion events to a SQLite journal from a background thread.
+
+    record() only queues the rows, the writer thread inserts them in batches
+    of up to 'batch_size' rows, committing at least every 'flush_interval'
+    seconds. Events are indexed by time and by region and time, see
+    query_events() and event_stats() for reading them back. Motion blobs,
+    when localization is enabled, are stored as a JSON list.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS events ("
+        "time REAL NOT NULL, region TEXT NOT NULL, changed_pixels INTEGER, score REAL, "
+        "dirty_tiles INTEGER, dirty_bbox TEXT, alerts TEXT, blobs TEXT)",
+        "CREATE INDEX IF NOT EXISTS events_time ON events (time)",
+        "CREATE INDEX IF NOT EXISTS events_region_time ON events (region, time)",
+    )
+    COLUMNS = ('time', 'region', 'changed_pixels', 'score', 'dirty_tiles', 'dirty_bbox', 'alerts', 'blobs')
+
+    def __init__(self, path, batch_size=100, flush_interval=1.0, queue_size=10000, metrics=None):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.metrics = metrics
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.connection = None
+        self.thread = threading.Thread(target=self.run, daemon=True, name="event-journal")
+        if metrics is not None:
+            metrics.register_gauge('queue_depth', self.queue.qsize, queue='journal')
+
+    def start(self):
+        """Opens the database and starts the writer, returns False if the journal cannot be opened."""
+        import sqlite3
+        try:
+            # Handed over to the writer thread, the only one using it from then on
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+        except sqlite3.Error as e:
+            print(f"Error opening event journal {self.path}: {e}")
+            return False
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")  # Readers do not block the writer
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+            # Journals created before blobs were recorded
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(events)")]
+            if 'blobs' not in columns:
+                connection.execute("ALTER TABLE events ADD COLUMN blobs TEXT")
+            connection.commit()
+        except sqlite3.Error as e:
+            print(f"Error opening event journal {self.path}: {e}")
+            connection.close()
+            return False
+        self.connection = connection
+        self.thread.start()
+        return True
+
+    def stop(self):
+        """Writes the queued events and waits for the writer thread."""
+        if self.thread.is_alive():
+            try:
+                self.queue.put(None, timeout=10)
+            except queue.Full:
+                print("Event journal writer is stuck, queued events are lost.")
+            self.thread.join(timeout=10)
+        if self.metrics is not None:
+            self.metrics.unregister_gauge('queue_depth', self.queue.qsize, queue='journal')
+
+    def record(self, regions, alerts=()):
+        """Queues one row per region without blocking, 'alerts' lists the alert outcomes."""
+        alerts = ','.join(alerts)
+        rows = []
+        for region in regions:
+            dirty_tiles, dirty_bbox = region.dirty_area or (None, None)
+            rows.append((
+                region.motion_detected_time or time.time(), region.name, region.changed_pixels, round(region.score, 3),
+                dirty_tiles, ','.join(str(value) for value in dirty_bbox) if dirty_bbox else None, alerts,
+                json.dumps(region.blobs) if region.blobs else None,
+            ))
+        if not self.thread.is_alive():
+            # Not started or the writer died, nothing would ever take the rows
+            if self.metrics is not None:
+                self.metrics.inc('journal_dropped_total', len(rows))
+            return
+        try:
+            self.queue.put_nowait(rows)
+        except queue.Full:
+            if self.metrics is not None:
+                self.metrics.inc('journal_dropped_total', len(rows))
+
+    def run(self):
+        import sqlite3
+        connection = self.connection
+        insert = f"INSERT INTO events ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})"
+        batch = []
+        running = True
+        while running:
+            # Collect rows until the batch is full or the flush interval is over
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    rows = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if rows is None:
+                    running = False
+                    break
+                batch.extend(rows)
+            if not batch:
+                continue
+            try:
+                with connection:
+                    connection.executemany(insert, batch)
+                if self.metrics is not None:
+                    self.metrics.inc('journal_events_total', len(batch))
+            except sqlite3.Error as e:
+                print(f"Error writing event journal: {e}")
+                if self.metrics is not None:
+                    self.metrics.inc('journal_dropped_total', len(batch))
+            batch = []
+        connection.close()
+        self.connection = None
+
+
+def journal_filter(since=None, until=None, region=None):
+    """Builds the WHERE clause and parameters of a journal query."""
+    conditions, parameters = [], []
+    if since is not None:
+        conditions.append("time >= ?")
+        parameters.append(since)
+    if until is not None:
+        conditions.append("time < ?")
+        parameters.append(until)
+    if region is not None:
+        conditions.append("region = ?")
+        parameters.append(region)
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), parameters
+
+
+def open_journal(path):
+    """Opens an existing event journal read-only."""
+    import sqlite3
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No event journal at {path}")
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def query_events(path, since=None, until=None, region=None, limit=None):
+    """Returns the journaled events in a time range (epoch seconds), newest first, as dicts.
+
+    'blobs' is decoded to a list of (x, y, width, height, area, centroid_x, centroid_y).
+    """
+    where, parameters = journal_filter(since, until, region)
+    sql = "SELECT * FROM events" + where + " ORDER BY time DESC"
+    if limit:
+        sql += " LIMIT ?"
+        parameters.append(limit)
+    connection = open_journal(path)
+    try:
+        events = [dict(row) for row in connection.execute(sql, parameters)]
+    finally:
+        connection.close()
+    for event in events:
+        event['blobs'] = [tuple(blob) for blob in json.loads(event['blobs'])] if event.get('blobs') else []
+    return events
+
+
+def event_stats(path, since=None, until=None, region=None, period=None):
+    """Returns event counts and score statistics per region.
+
+    With 'period' set to 'hour' or 'day' the statistics are also split by
+    local time period, the 'period' key then holds its start.
+    """
+    formats = {None: None, 'hour': '%Y-%m-%d %H:00', 'day': '%Y-%m-%d'}
+    period_format = formats[period]
+    where, parameters = journal_filter(since, until, region)
+    group = "region"
+    columns = "region"
+    if period_format:
+        columns = "strftime(?, time, 'unixepoch', 'localtime') AS period, region"
+        group = "period, region"
+        parameters.insert(0, period_format)
+    sql = (
+        f"SELECT {columns}, COUNT(*) AS events, MIN(time) AS first, MAX(time) AS last, "
+        "AVG(score) AS avg_score, MAX(score) AS max_score, SUM(alerts != '') AS alerted "
+        f"FROM events{where} GROUP BY {group} ORDER BY {group}"
+    )
+    connection = open_journal(path)
+    try:
+        return [dict(row) for row in connection.execute(sql, parameters)]
+    finally:
+        connection.close()
+
+
+def parse_time(value):
+    """Parses an ISO date/time, or an age such as '90m', '12h' or '2w', into epoch seconds."""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    if value[-1:] in units:
+        try:
+            return time.time() - float(value[:-1]) * units[value[-1]]
+        except ValueError:
+            pass
+    from datetime import datetime
+    return datetime.fromisoformat(value).timestamp()
+
+
+def format_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+def print_events(args):
+    """Prints journal events or statistics for the --events command line."""
+    path = config['Journal'].get('path', 'events.db')
+    since = parse_time(args.since) if args.since else None
+    until = parse_time(args.until) if args.until else None
+    if args.events == 'list':
+        for event in query_events(path, since, until, args.region, args.limit):
+            dirty = f" in {event['dirty_bbox']}" if event['dirty_bbox'] else ""
+            if event['dirty_tiles']:
+                dirty = f" {event['dirty_tiles']} tiles" + dirty
+            blobs = ""
+            if event['blobs']:
+                x, y, w, h, area, cx, cy = event['blobs'][0]
+                blobs = f", {len(event['blobs'])} blob(s), largest {w}x{h} at {x},{y} centroid {cx},{cy}"
+            print(f"{format_time(event['time'])}  {event['region']:<16} {event['score']:6.2f}%{dirty}{blobs}"
+                  f"  alerts: {event['alerts'] or 'none'}")
+    else:
+        for row in event_stats(path, since, until, args.region, args.by):
+            prefix = f"{row['period']}  " if args.by else ""
+            print(f"{prefix}{row['region']:<16} {row['events']:>7} events, {row['alerted']:>7} alerted, "
+                  f"score avg {row['avg_score']:.2f}% max {row['max_score']:.2f}%, "
+                  f"{format_time(row['first'])} to {format_time(row['last'])}")
+
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+STATUS_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>MotionGuard</title>
+<style>body{font-family:sans-serif;margin:1em}#state{display:inline-block;width:1em;height:1em;border-radius:50%;background:green}
+.region{display:inline-block;margin:0 1em 1em 0;vertical-align:top}img{display:block;max-width:480px}</style></head>
+<body><h1><span id="state"></span> MotionGuard</h1><div id="regions"></div><h2>Events</h2><ul id="events"></ul>
+<script>
+const state = document.getElementById('state'), events = document.getElementById('events');
+function addEvent(event) {
+  const item = document.createElement('li');
+  item.textContent = new Date(event.time * 1000).toLocaleString() + '  ' +
+    event.regions.map(region => region.name + ' ' + region.score.toFixed(1) + '%').join(', ');
+  events.prepend(item);
+  while (events.children.length > 50) events.lastChild.remove();
+}
+function connect() {
+  const socket = new WebSocket((location.protocol == 'https:' ? 'wss://' : 'ws://') + location.host + '/ws');
+  socket.onmessage = message => {
+    const data = JSON.parse(message.data);
+    if (data.type == 'status') {
+      document.getElementById('regions').innerHTML = data.regions.map((name, index) =>
+        '<div class="region"><b></b><img src="/preview/' + index + '.mjpg"></div>').join('');
+      document.querySelectorAll('.region b').forEach((label, index) => label.textContent = data.regions[index]);
+      events.innerHTML = '';
+      data.events.forEach(addEvent);
     }
+    if (data.type == 'status' || data.type == 'motion') state.style.background = data.motion ? 'red' : 'green';
+    if (data.type == 'event') addEvent(data);
+  };
+  socket.onclose = () => setTimeout(connect, 2000);
+}
+connect();
+</script></body></html>
+"""
+
+
+def websocket_frame(payload, opcode=0x1):
+    """Encodes an unmasked server WebSocket frame (text by default)."""
+    length = len(payload)
+    if length < 126:
+        header = bytes((0x80 | opcode, length))
+    elif length < 2 ** 16:
+        header = bytes((0x80 | opcode, 126)) + length.to_bytes(2, 'big')
+    else:
+        header = bytes((0x80 | opcode, 127)) + length.to_bytes(8, 'big')
+    return header + payload
+
+
+class StatusServer:
+    """Local HTTP server pushing the motion state, events and region previews.
+
+    An asyncio loop runs in a background thread and serves:
+    - GET /                    a status page using the two endpoints below
+    - GET /ws                  WebSocket, a JSON message per state change and motion event
+    - GET /preview/<n>.mjpg    MJPEG stream of region n
+    - GET /status              JSON snapshot of the state and recent events
+
+    The publish_*() methods are called from the detection thread and never
+    block: they only schedule work on the loop. A preview frame is JPEG
+    encoded once per region, in an executor thread, and shared by all the
+    streams; frames arriving while the previous one is encoded are skipped.
+    Each MJPEG stream sends the newest frame when its socket is ready, so a
+    slow client drops frames instead of queueing them, and each WebSocket
+    client has a bounded queue that drops its oldest message when full.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, preview_fps=2, jpeg_quality=70, client_queue=100, metrics=None):
+        self.host = host
+        self.port = port
+        self.preview_interval = 1 / preview_fps if preview_fps > 0 else 0
+        self.jpeg_quality = jpeg_quality
+        self.client_queue = client_queue
+        self.metrics = metrics
+        self.loop = None
+        self.server = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True, name="status-server")
+
+        # State below is only changed on the loop thread
+        self.regions = []  # (name, view) of the monitored regions
+        self.motion = False
+        self.recent_events = []
+        self.websocket_clients = set()  # One message queue per client
+        self.jpegs = []  # Latest encoded preview of each region
+        self.frame_seq = 0
+        self.frame_condition = None
+        # Read from the detection thread to skip unneeded frames
+        self.preview_clients = 0
+        self.encoding = False
+        self.last_frame_time = 0.0
+
+    def start(self):
+        """Starts the server thread, returns False if the server could not listen."""
+        self.thread.start()
+        self.ready.wait(timeout=5)
+        return self.server is not None
+
+    def stop(self):
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+    def run(self):
+        import asyncio
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.frame_condition = asyncio.Condition()
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self.handle_client, self.host, self.port))
+        except OSError as e:
+            print(f"Error starting status server: {e}")
+            self.ready.set()
+            self.loop.close()
+            return
+        self.port = self.server.sockets[0].getsockname()[1]
+        print(f"Serving status on http://{self.host}:{self.port}/")
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            # Close the listener and the open connections
+            self.server.close()
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+    # Called from the detection thread
+
+    def call(self, function, *args):
+        loop = self.loop
+        if loop is not None and loop.is_running():
+            try:
+                loop.call_soon_threadsafe(function, *args)
+            except RuntimeError:
+                pass  # Loop closed meanwhile
+
+    def set_regions(self, regions):
+        """Sets the regions streamed on /preview, called when detection starts."""
+        self.call(self.apply_regions, [(region.name, region.view) for region in regions])
+
+    def publish_motion(self, active):
+        self.call(self.broadcast, {'type': 'motion', 'time': time.time(), 'motion': active})
+
+    def publish_event(self, regions, alerts=()):
+        self.call(self.broadcast, {
+            'type': 'event',
+            'time': time.time(),
+            'regions': [
+                {'name': region.name, 'score': round(region.score, 3), 'changed_pixels': region.changed_pixels,
+                 'blobs': region.blobs}
+                for region in regions
+            ],
+            'alerts': list(alerts),
+        })
+
+    def wants_frame(self):
+        """True when a preview client is connected and a new frame is due."""
+        return (self.preview_clients > 0 and not self.encoding
+                and time.monotonic() - self.last_frame_time >= self.preview_interval)
+
+    def publish_frame(self, frame):
+        """Hands a copy of the captured frame to the encoder when wants_frame()."""
+        if not self.wants_frame():
+            return
+        self.last_frame_time = time.monotonic()
+        self.encoding = True
+        self.call(self.start_encoding, frame.copy())
+
+    # Loop thread
+
+    def apply_regions(self, regions):
+        self.regions = regions
+        self.jpegs = []
+
+    def broadcast(self, message):
+        import asyncio
+        if message['type'] == 'motion':
+            self.motion = message['motion']
+        else:
+            self.recent_events = (self.recent_events + [message])[-50:]
+        for messages in self.websocket_clients:
+            try:
+                messages.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow client, drop its oldest message
+                messages.get_nowait()
+                messages.put_nowait(message)
+                if self.metrics is not None:
+                    self.metrics.inc('status_messages_dropped_total')
+
+    def start_encoding(self, frame):
+        self.loop.create_task(self.encode(frame))
+
+    async def encode(self, frame):
+        try:
+            jpegs = await self.loop.run_in_executor(None, self.encode_regions, frame, list(self.regions))
+        except Exception as e:
+            print(f"Error encoding preview: {e}")
+            return
+        finally:
+            self.encoding = False
+        async with self.frame_condition:
+            self.jpegs = jpegs
+            self.frame_seq += 1
+            self.frame_condition.notify_all()
+
+    def encode_regions(self, frame, regions):
+        jpegs = []
+        for name, view in regions:
+            ok, data = cv2.imencode('.jpg', frame[view], [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            jpegs.append(data.tobytes() if ok else None)
+        return jpegs
+
+    def snapshot(self):
+        return {
+            'type': 'status',
+            'time': time.time(),
+            'motion': self.motion,
+            'regions': [name for name, view in self.regions],
+            'events': list(self.recent_events),
+            'clients': {'websocket': len(self.websocket_clients), 'preview': self.preview_clients},
+        }
+
+    async def handle_client(self, reader, writer):
+        import asyncio
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+            lines = request.decode('latin-1').split('\r\n')
+            method, path = lines[0].split(' ')[:2]
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            path = path.split('?')[0]
+
+            if method != 'GET':
+                await self.send_response(writer, '405 Method Not Allowed', 'text/plain', b'Method not allowed')
+            elif path == '/':
+                await self.send_response(writer, '200 OK', 'text/html; charset=utf-8', STATUS_PAGE.encode())
+            elif path == '/status':
+                await self.send_response(writer, '200 OK', 'application/json', json.dumps(self.snapshot()).encode())
+            elif path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                await self.serve_websocket(reader, writer, headers)
+            elif path.startswith('/preview/') and path.endswith('.mjpg') and path[9:-5].isdigit():
+                await self.serve_mjpeg(writer, int(path[9:-5]))
+            else:
+                await self.send_response(writer, '404 Not Found', 'text/plain', b'Not found')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass  # Client went away or sent a malformed request
+        except asyncio.CancelledError:
+            pass  # Server stopping, end the connection quietly
+        finally:
+            writer.close()
+
+    async def send_response(self, writer, status, content_type, body):
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            f"Cache-Control: no-cache\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def serve_websocket(self, reader, writer, headers):
+        import asyncio
+        import base64
+        import hashlib
+        key = headers.get('sec-websocket-key')
+        if not key:
+            await self.send_response(writer, '400 Bad Request', 'text/plain', b'Missing Sec-WebSocket-Key')
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+
+        messages = asyncio.Queue(maxsize=self.client_queue)
+        messages.put_nowait(self.snapshot())
+        self.websocket_clients.add(messages)
+        closed = asyncio.ensure_future(self.read_websocket(reader))
+        try:
+            while True:
+                message = asyncio.ensure_future(messages.get())
+                await asyncio.wait((message, closed), return_when=asyncio.FIRST_COMPLETED)
+                if closed.done():
+                    message.cancel()
+                    break
+                writer.write(websocket_frame(json.dumps(message.result()).encode()))
+                await writer.drain()
+            writer.write(websocket_frame(b'', opcode=0x8))
+        finally:
+            self.websocket_clients.discard(messages)
+            closed.cancel()
+
+    async def read_websocket(self, reader):
+        """Reads and discards client frames, returns when the client closes the connection."""
+        import asyncio
+        try:
+            while True:
+                header = await reader.readexactly(2)
+                length = header[1] & 0x7F
+                if length == 126:
+                    length = int.from_bytes(await reader.readexactly(2), 'big')
+                elif length == 127:
+                    length = int.from_bytes(await reader.readexactly(8), 'big')
+                if header[1] & 0x80:
+                    await reader.readexactly(4)  # Masking key
+                await reader.readexactly(length)
+                if header[0] & 0x0F == 0x8:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+
+    async def serve_mjpeg(self, writer, index):
+        if index >= len(self.regions):
+            await self.send_response(writer, '404 Not Found', 'text/plain', b'No such region')
+            return
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=frame\r\n"
+            b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n"
+        )
+        self.preview_clients += 1
+        # Start with the current frame when there is one
+        seq = self.frame_seq - 1 if index < len(self.jpegs) else self.frame_seq
+        try:
+            while True:
+                async with self.frame_condition:
+                    await self.frame_condition.wait_for(lambda: self.frame_seq != seq)
+                    if self.metrics is not None and self.frame_seq - seq > 1:
+                        self.metrics.inc('preview_frames_dropped_total', self.frame_seq - seq - 1)
+                    seq = self.frame_seq
+                    jpeg = self.jpegs[index] if index < len(self.jpegs) else None
+                if jpeg is None:
+                    continue
+                writer.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(jpeg) + jpeg + b"\r\n")
+                # Waits for a slow client, newer frames are skipped meanwhile
+                await writer.drain()
+        finally:
+            self.preview_clients -= 1
+
+
+def load_regions():
+    """Returns the monitored regions saved in the configuration ('Region:<name>' sections)."""
+    regions = []
+    for section in config.sections():
+        if not section.startswith('Region:'):
+            continue
+        values = config[section]
+        try:
+            bbox = tuple(int(value) for value in values['bbox'].split(','))
+        except (KeyError, ValueError):
+            print(f"Ignoring region '{section}': invalid bbox.")
+            continue
+        regions.append(MonitoredRegion(section[len('Region:'):], bbox, values.getint('sensitivity', 50), values.getint('cooldown', 10)))
+    return regions
+
+
+def save_regions(regions):
+    """Replaces the regions saved in the configuration."""
+    for section in config.sections():
+        if section.startswith('Region:'):
+            config.remove_section(section)
+    for region in regions:
+        config[f'Region:{region.name}'] = {
+            'bbox': ','.join(str(value) for value in region.bbox),
+            'sensitivity': str(region.sensitivity),
+            'cooldown': str(region.cooldown_time),
+        }
+
+
+def smtp_settings_from_config():
+    return {key: config['SMTP'][key] for key in ('server', 'port', 'email', 'password', 'recipient', 'subject', 'body')}
+
+
+def create_email_dispatcher(settings):
+    return EmailDispatcher(
+        settings,
+        config.getfloat('SMTP', 'min_interval', fallback=30),
+        config.getint('SMTP', 'queue_size', fallback=100),
+        metrics=metrics,
+    )
+
+
+def start_metrics_exporter():
+    """Starts the metrics exporter when enabled in the configuration."""
+    if not config.getboolean('Metrics', 'enabled', fallback=False):
+        return None
+    exporter = MetricsExporter(
+        metrics,
+        config['Metrics'].get('http_host', '127.0.0.1'),
+        config.getint('Metrics', 'http_port', fallback=0),
+        config['Metrics'].get('json_log', ''),
+        config.getfloat('Metrics', 'log_interval', fallback=60),
+    )
+    exporter.start()
+    return exporter
+
+
+def start_event_journal():
+    """Starts the event journal writer when enabled in the configuration."""
+    if not config.getboolean('Journal', 'enabled', fallback=False):
+        return None
+    journal = EventJournal(
+        config['Journal'].get('path', 'events.db'),
+        config.getint('Journal', 'batch_size', fallback=100),
+        config.getfloat('Journal', 'flush_interval', fallback=1),
+        metrics=metrics,
+    )
+    if not journal.start():
+        print("Event journal disabled.")
+        return None
+    return journal
+
+
+def start_status_server():
+    """Starts the local status and preview server when enabled in the configuration."""
+    if not config.getboolean('Server', 'enabled', fallback=False):
+        return None
+    server = StatusServer(
+        config['Server'].get('host', '127.0.0.1'),
+        config.getint('Server', 'port', fallback=8765),
+        config.getfloat('Server', 'preview_fps', fallback=2),
+        config.getint('Server', 'jpeg_quality', fallback=70),
+        config.getint('Server', 'client_queue', fallback=100),
+        metrics,
+    )
+    return server if server.start() else None
+
+
+def create_detector(regions, on_motion=None):
+    """Builds the capture source and detector for the regions from the configuration.
+
+    Regions without a bbox (replay only) cover the whole frame.
+    """
+    bboxes = [region.bbox for region in regions if region.bbox is not None]
+    source_spec = (
+        config['Capture'].get('backend', 'pil'),
+        union_bbox(bboxes) if bboxes else None,
+        config['Capture'].get('replay_path', ''),
+        config.getboolean('Capture', 'replay_loop', fallback=False),
+    )
+
+    localizer = None
+    if config.getboolean('Detection', 'localize', fallback=False):
+        localizer = MotionLocalizer(
+            config.getfloat('Detection', 'localize_scale', fallback=0.25),
+            config.getint('Detection', 'min_blob_area', fallback=25),
+        )
+
+    if config['Detection'].get('engine', 'thread') == 'process':
+        if config.getboolean('Recording', 'enabled', fallback=False):
+            print("Motion clips are not recorded with the process engine.")
+        return ProcessDetectionEngine(
+            source_spec,
+            regions,
+            config.getint('Detection', 'tile_size', fallback=0),
+            config.getint('Detection', 'tile_sample_step', fallback=4),
+            config.getint('Detection', 'workers', fallback=0),
+            on_motion=on_motion,
+            metrics=metrics,
+            localizer=localizer,
+            pyramid=config.getint('Detection', 'pyramid', fallback=0),
+            pyramid_margin=config.getfloat('Detection', 'pyramid_margin', fallback=2),
+        )
+
+    # Optional motion clips, one recorder per region sharing a writer thread
+    clip_writer = recorder_factory = None
+    if config.getboolean('Recording', 'enabled', fallback=False):
+        recording = config['Recording']
+        clip_writer = ClipWriter(recording.get('output_dir', 'clips'), recording.get('format', 'video'), metrics)
+        clip_writer.start()
+
+        def recorder_factory(region, shape):
+            return ClipRecorder(
+                region.name, shape, clip_writer,
+                recording.getfloat('pre_seconds', 5),
+                recording.getfloat('post_seconds', 5),
+                config.getfloat('Detection', 'target_fps', fallback=10),
+                int(recording.getfloat('max_mb', 64) * 2 ** 20),
+                recording.getfloat('scale', 0.5),
+                recording.getint('jpeg_quality', 0),
+                metrics,
+            )
+
+    source = create_capture_source(*source_spec)
+    return MotionDetector(
+        source,
+        regions,
+        config.getint('Detection', 'tile_size', fallback=0),
+        config.getint('Detection', 'tile_sample_step', fallback=4),
+        config.getint('Detection', 'scoring_threads', fallback=0),
+        on_motion=on_motion,
+        metrics=metrics,
+        recorder_factory=recorder_factory,
+        clip_writer=clip_writer,
+        localizer=localizer,
+        pyramid=config.getint('Detection', 'pyramid', fallback=0),
+        pyramid_margin=config.getfloat('Detection', 'pyramid_margin', fallback=2),
+    )
+
+
+def create_scheduler():
+    return FrameScheduler(
+        config.getfloat('Detection', 'target_fps', fallback=10),
+        config.getfloat('Detection', 'idle_fps', fallback=5),
+        config.getfloat('Detection', 'idle_backoff', fallback=5),
+    )
+
+
+def wait_for_next_frame(scheduler, detector):
+    """Paces the loop from the motion state and records scheduling metrics."""
+    # Run at full rate while motion is recent, back off when idle
+    scheduler.set_active(detector.is_active())
+    detector.set_frame_period(scheduler.period)
+    metrics.set_gauge('frame_period_seconds', scheduler.period)
+    if not scheduler.wait():
+        # Falling behind real time
+        metrics.inc('deadlines_missed_total')
+    metrics.set_gauge('frame_lag_seconds', scheduler.lag)
 
-# Save the updated configuration (in case 'volume' was missing)
-with open(config_file, 'w') as configfile:
-    config.write(configfile)
 
 class MotionDetectorApp:
     def __init__(self, root):
@@ -75,27 +2638,39 @@ class MotionDetectorApp:
         self.root.geometry("570x800")
         self.root.resizable(False, False)  # Fixed window size
 
-        self.selected_area = None
+        self.regions = []  # Monitored regions, each with its own sensitivity and cooldown
+        self.selected_region = None  # Region edited by the sliders
+        self.region_counter = 0  # Used to name new regions
         self.sensitivity = 50  # Default sensitivity
         self.cooldown_time = 10  # Default cooldown time in seconds for the red dot
         self.is_running = False  # Track if detection is running
-        self.motion_detected_time = None  # Time when motion was detected
-        self.sound_playing = False  # Track if sound is currently playing
+        self.journal = None  # Event journal of the current detection run
 
         # Load settings from config
         self.sound_alert_enabled = config.getboolean('SoundAlert', 'enabled')
         self.sound_file = config['SoundAlert']['sound_file']
         self.sound_volume = float(config['SoundAlert']['volume'])
+        self.sound_player = SoundPlayer(self.sound_volume, metrics)
+        self.sound_player.start()
+        if self.sound_alert_enabled:
+            self.sound_player.preload(self.sound_file)
         self.smtp_enabled = config.getboolean('SMTP', 'enabled')
-        self.smtp_settings = {
-            'server': config['SMTP']['server'],
-            'port': config['SMTP']['port'],
-            'email': config['SMTP']['email'],
-            'password': config['SMTP']['password'],
-            'recipient': config['SMTP']['recipient'],
-            'subject': config['SMTP']['subject'],
-            'body': config['SMTP']['body']
-        }
+        self.smtp_settings = smtp_settings_from_config()
+        self.email_dispatcher = create_email_dispatcher(self.smtp_settings)
+        self.email_dispatcher.start()
+        self.capture_backend = config['Capture'].get('backend', 'pil')
+        self.regions = load_regions()
+        # Continue after the highest saved "Region N", so new areas never reuse a saved name
+        self.region_counter = max([int(region.name[7:]) for region in self.regions
+                                   if region.name.startswith("Region ") and region.name[7:].isdigit()], default=0)
+        self.preview_enabled = config.getboolean('Preview', 'enabled', fallback=False)
+        self.preview_interval = 1 / config.getfloat('Preview', 'max_fps', fallback=2)
+        self.preview_width = config.getint('Preview', 'width', fallback=240)
+
+        # Optional metrics export, /metrics endpoint and periodic JSON log
+        self.metrics_exporter = start_metrics_exporter()
+        # Optional local status page, WebSocket events and MJPEG previews
+        self.status_server = start_status_server()
 
         # Create notebook with tabs
         self.notebook = ttk.Notebook(root)
@@ -111,13 +2686,22 @@ class MotionDetectorApp:
         title_label.pack(pady=10)  # Add title at the top with some padding
 
         # Subtitle
-        subtitle_label = tk.Label(self.main_frame, text="Detect movement in a selected area", font=("Arial", 12))
+        subtitle_label = tk.Label(self.main_frame, text="Detect movement in selected areas", font=("Arial", 12))
         subtitle_label.pack(pady=5)  # Add subtitle below the title
 
         # Main tab components
-        self.select_button = tk.Button(self.main_frame, text="Select Screen Area", command=self.take_screenshot)
+        self.select_button = tk.Button(self.main_frame, text="Select Screen Areas", command=self.take_screenshot)
         self.select_button.pack(pady=10)
 
+        # Monitored regions, the sliders below edit the selected one
+        self.region_listbox = tk.Listbox(self.main_frame, height=4, width=50, exportselection=False)
+        self.region_listbox.pack(pady=5)
+        self.region_listbox.bind("<<ListboxSelect>>", self.on_region_select)
+        self.refresh_region_list()
+
+        self.remove_button = tk.Button(self.main_frame, text="Remove Area", command=self.remove_region)
+        self.remove_button.pack(pady=5)
+
         self.sensitivity_label = tk.Label(self.main_frame, text="Sensitivity (%)")
         self.sensitivity_label.pack()
 
@@ -142,7 +2726,12 @@ class MotionDetectorApp:
         # Indicator for motion detection (red = motion, green = no motion)
         self.motion_indicator = tk.Canvas(self.main_frame, width=20, height=20)
         self.motion_indicator.pack(pady=10)
-        self.set_motion_indicator(False)  # Start with green (no motion)
+        self.indicator_oval = self.motion_indicator.create_oval(2, 2, 18, 18, fill="green")  # Start with green (no motion)
+        self.indicator_state = False
+
+        # Optional live preview of the monitored areas
+        self.preview_label = tk.Label(self.main_frame)
+        self.preview_label.pack(pady=5)
 
         # Credit link
         credit = tk.Label(self.main_frame, text="Made by Clément GHANEME", fg="blue", cursor="hand2")
@@ -152,11 +2741,57 @@ class MotionDetectorApp:
         # Settings tab components
         self.build_settings_tab()
 
+        # The detection thread never touches Tk, it publishes state changes
+        # to this queue and the main loop applies them
+        self.ui_events = queue.SimpleQueue()
+        self.ui_poll_interval = 50  # ms
+        self.preview_frame = None
+        self.preview_image = None
+        self.root.after(self.ui_poll_interval, self.poll_ui_events)
+
     def set_motion_indicator(self, motion_detected):
         """Sets the motion indicator color based on whether motion is detected or not."""
-        self.motion_indicator.delete("all")
-        color = "red" if motion_detected else "green"
-        self.motion_indicator.create_oval(2, 2, 18, 18, fill=color)
+        if motion_detected == self.indicator_state:
+            return
+        self.indicator_state = motion_detected
+        self.motion_indicator.itemconfig(self.indicator_oval, fill="red" if motion_detected else "green")
+
+    def poll_ui_events(self):
+        """Applies the state published by the detection thread, runs on the Tk main loop."""
+        try:
+            while True:
+                event = self.ui_events.get_nowait()
+                if event[0] == 'motion':
+                    # Ignore late events of a detection that was stopped
+                    if self.is_running:
+                        self.set_motion_indicator(event[1])
+                elif event[0] == 'stopped':
+                    self.stop_detection()
+        except queue.Empty:
+            pass
+
+        # Only the latest preview frame is kept, older ones were skipped
+        frame, self.preview_frame = self.preview_frame, None
+        if frame is not None and self.is_running:
+            # The detection thread only subsampled the frame, scaling happens here
+            height, width = frame.shape
+            scale = min(1.0, self.preview_width / width)
+            if scale < 1.0:
+                size = (max(1, int(width * scale)), max(1, int(height * scale)))
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            self.preview_image = ImageTk.PhotoImage(Image.fromarray(frame))
+            self.preview_label.config(image=self.preview_image)
+
+        self.root.after(self.ui_poll_interval, self.poll_ui_events)
+
+    def publish_preview(self, frame):
+        """Hands a subsampled copy of the frame to the Tk thread, replacing any unread one.
+
+        Runs on the detection thread, so it only takes every n-th pixel (still
+        at least 'preview_width' wide); poll_ui_events() does the area resize.
+        """
+        step = max(1, frame.shape[1] // self.preview_width)
+        self.preview_frame = frame[::step, ::step].copy()
 
     def take_screenshot(self):
         # Take a full-screen screenshot
@@ -180,10 +2815,17 @@ class MotionDetectorApp:
         self.start_y = None
         self.rect = None
 
+        # Instructions, several areas can be drawn before closing the window
+        self.canvas.create_text(20, 20, anchor=tk.NW, fill="red", font=("Arial", 14, "bold"),
+                                text="Drag to add areas, press Enter or Escape when done")
+
         # Bind mouse events to draw the rectangle
         self.canvas.bind("<ButtonPress-1>", self.on_button_press)
         self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_button_release)
+        self.selection_window.bind("<Return>", lambda e: self.selection_window.destroy())
+        self.selection_window.bind("<Escape>", lambda e: self.selection_window.destroy())
+        self.selection_window.focus_force()
 
     def on_button_press(self, event):
         # Record the starting point
@@ -203,21 +2845,64 @@ class MotionDetectorApp:
         end_x, end_y = event.x, event.y
 
         # Store the selected area (top-left and bottom-right coordinates)
-        self.selected_area = (min(self.start_x, end_x), min(self.start_y, end_y), max(self.start_x, end_x), max(self.start_y, end_y))
+        bbox = (min(self.start_x, end_x), min(self.start_y, end_y), max(self.start_x, end_x), max(self.start_y, end_y))
 
-        # Close the selection window
-        self.selection_window.destroy()
+        # Ignore clicks without a drag
+        if bbox[2] - bbox[0] < 2 or bbox[3] - bbox[1] < 2:
+            self.canvas.delete(self.rect)
+            return
+
+        names = {region.name for region in self.regions}
+        self.region_counter += 1
+        while f"Region {self.region_counter}" in names:
+            self.region_counter += 1
+        region = MonitoredRegion(f"Region {self.region_counter}", bbox, self.sensitivity, self.cooldown_time)
+        self.regions.append(region)
+        self.canvas.create_text(bbox[0] + 4, bbox[1] + 4, anchor=tk.NW, fill="red", text=region.name)
+
+        # Select the new region in the list
+        self.refresh_region_list()
+        self.region_listbox.selection_clear(0, tk.END)
+        self.region_listbox.selection_set(tk.END)
+        self.selected_region = region
+
+    def refresh_region_list(self):
+        """Shows the monitored regions in the list box."""
+        self.region_listbox.delete(0, tk.END)
+        for region in self.regions:
+            self.region_listbox.insert(tk.END, f"{region.name}  {region.bbox}")
+
+    def on_region_select(self, event):
+        """Loads the selected region's settings into the sliders."""
+        selection = self.region_listbox.curselection()
+        if not selection:
+            return
+        self.selected_region = self.regions[selection[0]]
+        self.sensitivity_slider.set(self.selected_region.sensitivity)
+        self.cooldown_slider.set(self.selected_region.cooldown_time)
+
+    def remove_region(self):
+        """Removes the selected region."""
+        if self.selected_region in self.regions:
+            self.regions.remove(self.selected_region)
+        self.selected_region = None
+        self.refresh_region_list()
 
     def update_sensitivity(self, val):
         """Update sensitivity dynamically."""
         self.sensitivity = int(val)
+        if self.selected_region is not None:
+            self.selected_region.sensitivity = self.sensitivity
 
     def update_cooldown(self, val):
         """Update the cooldown time for the red dot."""
         self.cooldown_time = int(val)
+        if self.selected_region is not None:
+            self.selected_region.cooldown_time = self.cooldown_time
 
     def start_detection(self):
-        if self.selected_area is None:
+        # Replay sources do not need a screen area, it only crops when set
+        if not self.regions and self.capture_backend != 'replay':
             messagebox.showerror("Error", "Please select an area first.")
             return
 
@@ -225,6 +2910,8 @@ class MotionDetectorApp:
         self.is_running = True
         self.start_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
+        self.select_button.config(state=tk.DISABLED)
+        self.remove_button.config(state=tk.DISABLED)
 
         # Start detection in a separate thread
         self.detection_thread = threading.Thread(target=self.detect_motion)
@@ -235,91 +2922,84 @@ class MotionDetectorApp:
         self.is_running = False
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
+        self.select_button.config(state=tk.NORMAL)
+        self.remove_button.config(state=tk.NORMAL)
         self.set_motion_indicator(False)
+        self.preview_label.config(image='')
 
     def detect_motion(self):
+        # Without regions (replay only) the whole frame is monitored
+        regions = list(self.regions) or [MonitoredRegion("Full frame", None, self.sensitivity, self.cooldown_time)]
+        detector = scheduler = None
         try:
-            # Capture the first frame within the selected area
-            prev_frame = np.array(ImageGrab.grab(bbox=self.selected_area).convert('L'))
+            # Invalid settings fail here, the finally block stops what was started
+            self.journal = start_event_journal()
+            detector = create_detector(regions, on_motion=self.dispatch_alerts)
+
+            # Capture the first frame within the selected areas
+            if not detector.start():
+                print("Capture source exhausted, stopping detection.")
+                self.ui_events.put(('stopped',))
+                return
+            scheduler = create_scheduler()
+            if self.status_server is not None:
+                self.status_server.set_regions(regions)
+            published_motion = False
+            last_preview = 0.0
 
             while self.is_running:
-                # Capture the current frame within the selected area
-                curr_frame = np.array(ImageGrab.grab(bbox=self.selected_area).convert('L'))
-
-                # Check if the frame sizes match
-                if prev_frame.shape != curr_frame.shape:
-                    print("Error: Frame sizes do not match!")
-                    continue
-
-                # Calculate the difference between frames
-                diff = cv2.absdiff(prev_frame, curr_frame)
-                _, diff_thresh = cv2.threshold(diff, 25, 255, cv2.THRESH_BINARY)
-
-                # Calculate the motion score based on the differences
-                motion_score = np.sum(diff_thresh) / diff_thresh.size
-
-                # If motion score exceeds the inversed sensitivity threshold, trigger the motion event
-                if motion_score > (100 - self.sensitivity) * 255 / 100:
-                    self.motion_detected_time = time.time()  # Log the time of motion detection
-                    self.set_motion_indicator(True)  # Red = Motion Detected
-
-                    # Play sound if enabled
-                    if self.sound_alert_enabled and self.sound_file:
-                        self.play_sound(self.sound_file)
-
-                    # Send email if enabled
-                    if self.smtp_enabled:
-                        self.send_email()
-                else:
-                    # Keep red for the cooldown period after last detection
-                    if self.motion_detected_time and time.time() - self.motion_detected_time < self.cooldown_time:
-                        self.set_motion_indicator(True)
-                    else:
-                        self.set_motion_indicator(False)
-
-                # Update previous frame for the next comparison
-                prev_frame = curr_frame
-                time.sleep(0.1)
+                # Grab the union of the areas once and score every region on it
+                triggered = detector.step()
+                if triggered is None:
+                    print("Capture source exhausted, stopping detection.")
+                    self.ui_events.put(('stopped',))
+                    break
+
+                # Keep red for the cooldown period after last detection, only changes are published
+                motion = detector.is_active()
+                if motion != published_motion:
+                    self.ui_events.put(('motion', motion))
+                    if self.status_server is not None:
+                        self.status_server.publish_motion(motion)
+                    published_motion = motion
+
+                # Throttled preview of the latest frame
+                if self.preview_enabled and time.monotonic() - last_preview >= self.preview_interval:
+                    last_preview = time.monotonic()
+                    self.publish_preview(detector.latest_frame())
+                if self.status_server is not None and self.status_server.wants_frame():
+                    self.status_server.publish_frame(detector.latest_frame())
+
+                wait_for_next_frame(scheduler, detector)
         except Exception as e:
             print(f"Error during motion detection: {e}")
-
-    def send_email(self):
-        """Send an email using the configured SMTP settings with enhanced logging."""
-        try:
-            msg = MIMEText(self.smtp_settings['body'])
-            msg['Subject'] = self.smtp_settings['subject']
-            msg['From'] = self.smtp_settings['email']
-            msg['To'] = self.smtp_settings['recipient']
-
-            # Check if port 465 for SSL is being used
-            if self.smtp_settings['port'] == '465':
-                print(f"Connecting to SMTP server {self.smtp_settings['server']} on port {self.smtp_settings['port']} using SSL...")
-                server = smtplib.SMTP_SSL(self.smtp_settings['server'], int(self.smtp_settings['port']))
-            else:
-                print(f"Connecting to SMTP server {self.smtp_settings['server']} on port {self.smtp_settings['port']}...")
-                server = smtplib.SMTP(self.smtp_settings['server'], int(self.smtp_settings['port']))
-                server.ehlo()
-                if self.smtp_settings['port'] == '587':  # Port 587 uses TLS
-                    print("Starting TLS...")
-                    server.starttls()
-                    server.ehlo()  # Re-identify ourselves after starting TLS
-
-            print(f"Logging in as {self.smtp_settings['email']}...")
-            server.login(self.smtp_settings['email'], self.smtp_settings['password'])
-            
-            print("Sending email...")
-            server.sendmail(self.smtp_settings['email'], [self.smtp_settings['recipient']], msg.as_string())
-            print("Email sent successfully.")
-            server.quit()
-
-        except smtplib.SMTPAuthenticationError:
-            print("Authentication failed: Incorrect username or password.")
-        except smtplib.SMTPConnectError:
-            print("Connection error: Unable to establish a connection with the server.")
-        except smtplib.SMTPServerDisconnected:
-            print("The server unexpectedly disconnected.")
-        except Exception as e:
-            print(f"Error sending email: {e}")
+            self.ui_events.put(('stopped',))
+        finally:
+            if detector is not None:
+                detector.close()
+            if self.journal is not None:
+                self.journal.stop()
+                self.journal = None
+            if self.status_server is not None:
+                self.status_server.publish_motion(False)
+            if scheduler is not None and scheduler.missed_deadlines:
+                print(f"Detection missed {scheduler.missed_deadlines} frame deadlines.")
+
+    def dispatch_alerts(self, regions):
+        """Triggers the motion event for the regions whose score exceeded their sensitivity threshold."""
+        alerts = []
+        # Play sound if enabled
+        if self.sound_alert_enabled and self.sound_file:
+            alerts.append('sound' if self.play_sound(self.sound_file) else 'sound-busy')
+
+        # Send email if enabled, the dispatcher thread does the network work
+        if self.smtp_enabled:
+            alerts.append('email' if self.email_dispatcher.notify([describe_motion(region) for region in regions]) else 'email-dropped')
+
+        if self.journal is not None:
+            self.journal.record(regions, alerts)
+        if self.status_server is not None:
+            self.status_server.publish_event(regions, alerts)
 
     def build_settings_tab(self):
         """Builds the settings tab with Sound Alert and SMTP settings."""
@@ -394,7 +3074,16 @@ class MotionDetectorApp:
 
     def choose_sound_file(self):
         """Opens a file dialog to choose a sound file."""
-        self.sound_file = filedialog.askopenfilename(filetypes=[("Audio Files", "*.wav *.mp3")])
+        sound_file = filedialog.askopenfilename(filetypes=[("Audio Files", "*.wav *.mp3")])
+        if not sound_file:
+            return
+
+        # The file may have been edited on disk, decode it again
+        self.sound_player.invalidate(sound_file)
+        if self.sound_file != sound_file:
+            self.sound_player.invalidate(self.sound_file)
+        self.sound_file = sound_file
+        self.sound_player.preload(sound_file)
 
     def apply_config(self):
         """Applies the settings and saves them to the config file."""
@@ -410,6 +3099,7 @@ class MotionDetectorApp:
             'subject': self.smtp_subject_entry.get(),
             'body': self.smtp_body_entry.get()
         }
+        self.email_dispatcher.update_settings(self.smtp_settings)
 
         # Save to config file
         config['SoundAlert']['enabled'] = str(self.sound_alert_enabled)
@@ -425,37 +3115,160 @@ class MotionDetectorApp:
         config['SMTP']['subject'] = self.smtp_settings['subject']
         config['SMTP']['body'] = self.smtp_settings['body']
 
-        with open(config_file, 'w') as configfile:
-            config.write(configfile)
-
-    def play_sound(self, sound_file):
-        """Plays the selected sound file using pygame if it is not already playing."""
-        if not self.sound_playing:
-            try:
-                pygame.mixer.music.load(sound_file)
-                pygame.mixer.music.set_volume(self.sound_volume)
-                pygame.mixer.music.play()
+        # Monitored areas, also used by the headless mode
+        save_regions(self.regions)
 
-                self.sound_playing = True
-                pygame.mixer.music.set_endevent(pygame.USEREVENT)
-                threading.Thread(target=self.check_sound_end).start()
+        save_config()
 
-            except Exception as e:
-                print(f"Error playing sound: {e}")
-
-    def check_sound_end(self):
-        """Waits for the sound to finish and resets the state."""
-        while pygame.mixer.music.get_busy():
-            time.sleep(0.1)
-        self.sound_playing = False
+    def play_sound(self, sound_file):
+        """Plays the selected sound file if it is not already playing."""
+        return self.sound_player.play(sound_file)
 
     def update_volume(self, val):
         """Updates the sound volume from the slider."""
         self.sound_volume = float(val)
-        pygame.mixer.music.set_volume(self.sound_volume)
+        self.sound_player.set_volume(self.sound_volume)
 
-# Main application
-if __name__ == "__main__":
+
+class MotionGuardDaemon:
+    """Runs detection without the GUI, using the regions and settings of the configuration."""
+
+    def __init__(self):
+        self.stop_event = threading.Event()
+        self.sound_enabled = config.getboolean('SoundAlert', 'enabled') and bool(config['SoundAlert']['sound_file'])
+        self.sound_file = config['SoundAlert']['sound_file']
+        self.sound_player = None
+        self.email_dispatcher = None
+        self.journal = None
+        self.status_server = None
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+    def run(self):
+        regions = load_regions()
+        if not regions:
+            if config['Capture'].get('backend', 'pil') != 'replay':
+                print("No regions configured, select areas in the GUI and apply the config first.")
+                return 1
+            regions = [MonitoredRegion("Full frame", None)]
+
+        exporter = detector = scheduler = None
+        try:
+            # Alert modules are only loaded when enabled. Invalid settings fail
+            # here, the finally block stops what was started.
+            if self.sound_enabled:
+                self.sound_player = SoundPlayer(config.getfloat('SoundAlert', 'volume', fallback=1.0), metrics)
+                self.sound_player.start()
+                self.sound_player.preload(self.sound_file)
+            if config.getboolean('SMTP', 'enabled'):
+                self.email_dispatcher = create_email_dispatcher(smtp_settings_from_config())
+                self.email_dispatcher.start()
+            exporter = start_metrics_exporter()
+            self.journal = start_event_journal()
+            self.status_server = start_status_server()
+            detector = create_detector(regions, on_motion=self.dispatch_alerts)
+            scheduler = create_scheduler()
+
+            if not detector.start():
+                print("Capture source exhausted, stopping detection.")
+                return 1
+            startup = time.perf_counter() - IMPORT_START
+            metrics.set_gauge('startup_seconds', startup)
+            print(f"Monitoring {len(regions)} region(s), first frame {startup * 1000:.0f} ms after import.")
+            if self.status_server is not None:
+                self.status_server.set_regions(regions)
+            published_motion = False
+
+            while not self.stop_event.is_set():
+                if detector.step() is None:
+                    print("Capture source exhausted, stopping detection.")
+                    break
+                if self.status_server is not None:
+                    # Only state changes are pushed to the clients
+                    motion = detector.is_active()
+                    if motion != published_motion:
+                        self.status_server.publish_motion(motion)
+                        published_motion = motion
+                    if self.status_server.wants_frame():
+                        self.status_server.publish_frame(detector.latest_frame())
+                wait_for_next_frame(scheduler, detector)
+        except Exception as e:
+            print(f"Error during motion detection: {e}")
+            return 1
+        finally:
+            if detector is not None:
+                detector.close()
+            if scheduler is not None and scheduler.missed_deadlines:
+                print(f"Detection missed {scheduler.missed_deadlines} frame deadlines.")
+            if self.sound_player is not None:
+                self.sound_player.stop()
+            if self.email_dispatcher is not None:
+                self.email_dispatcher.stop()
+            if self.journal is not None:
+                self.journal.stop()
+            if self.status_server is not None:
+                self.status_server.stop()
+            if exporter is not None:
+                exporter.stop()
+        return 0
+
+    def dispatch_alerts(self, regions):
+        print(f"Motion detected in: {', '.join(describe_motion(region) for region in regions)}")
+        alerts = []
+        if self.sound_player is not None:
+            alerts.append('sound' if self.sound_player.play(self.sound_file) else 'sound-busy')
+        if self.email_dispatcher is not None:
+            alerts.append('email' if self.email_dispatcher.notify([describe_motion(region) for region in regions]) else 'email-dropped')
+        if self.journal is not None:
+            self.journal.record(regions, alerts)
+        if self.status_server is not None:
+            self.status_server.publish_event(regions, alerts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MotionGuard: intelligent screen area motion detection.")
+    parser.add_argument('--config', default="config.ini", help="Configuration file (default: config.ini)")
+    parser.add_argument('--headless', action='store_true', help="Run detection without the GUI, using the saved regions")
+    parser.add_argument('--install-deps', action='store_true', help="Install missing dependencies with pip and exit")
+    parser.add_argument('--events', choices=('list', 'stats'), help="Print the journaled motion events or their statistics and exit")
+    parser.add_argument('--since', help="Events from this time, ISO date/time or age such as 12h, 7d, 2w")
+    parser.add_argument('--until', help="Events before this time, same format as --since")
+    parser.add_argument('--region', help="Only the events of this region")
+    parser.add_argument('--limit', type=int, default=50, help="Maximum number of events listed (0 = all)")
+    parser.add_argument('--by', choices=('hour', 'day'), help="Split the statistics by hour or day")
+    args = parser.parse_args(argv)
+
+    if args.install_deps:
+        for package, import_name in dependencies.items():
+            check_install(package, import_name)
+        return 0
+
+    load_config(args.config)
+
+    if args.events:
+        try:
+            print_events(args)
+        except ValueError as e:
+            parser.error(f"invalid time: {e}")
+        except Exception as e:
+            print(f"Error reading event journal: {e}")
+            return 1
+        return 0
+
+    if args.headless:
+        daemon = MotionGuardDaemon()
+        signal.signal(signal.SIGINT, daemon.stop)
+        signal.signal(signal.SIGTERM, daemon.stop)
+        return daemon.run()
+
+    # Main application
+    import_gui()
     root = tk.Tk()
     app = MotionDetectorApp(root)
     root.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""Offline motion analysis of recorded videos and screenshot folders.
+
+Re-runs the MotionGuard frame differencing over recordings much faster than
+real time. Frames are streamed in chunks and each chunk is diffed,
+thresholded and counted in a few vectorized calls. Files, and segments of
+long recordings, are spread over a process pool. Several sensitivities are
+evaluated in the same pass, as they only change the limit applied to the
+changed pixel counts.
+
+The output is a per-frame score series (CSV) and the motion events for each
+sensitivity and region (JSON and a console summary).
+
+Examples:
+    python analyze.py recording.mp4 --sensitivity 50 70 90
+    python analyze.py day1.mp4 day2.mp4 screenshots/ --workers 4 --csv scores.csv --json events.json
+    python analyze.py recording.mp4 --region door=100,50,400,300 --region desk=500,0,900,400
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+import MotionGuard_V04 as mg
+
+PIXEL_THRESHOLD = 25  # Same as FrameDiffEngine
+
+
+def parse_region(value):
+    """Parses NAME=LEFT,TOP,RIGHT,BOTTOM (the name is optional)."""
+    name, _, bbox = value.rpartition('=')
+    try:
+        left, top, right, bottom = (int(number) for number in bbox.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid region '{value}', expected NAME=LEFT,TOP,RIGHT,BOTTOM")
+    return name or bbox, (left, top, right, bottom)
+
+
+def plan_segments(paths, segment_frames):
+    """Splits the recordings into (path, start, stop) jobs of at most 'segment_frames' frames.
+
+    The last segment of each recording has no stop and reads until the end,
+    video frame counts are only estimates.
+    """
+    jobs = []
+    for path in paths:
+        source = mg.ReplayCaptureSource(path)
+        source.open()
+        try:
+            count = source.frame_count()
+        finally:
+            source.close()
+        starts = list(range(0, count, segment_frames)) if segment_frames > 0 and count > 0 else [0]
+        for index, start in enumerate(starts):
+            jobs.append((path, start, starts[index + 1] if index + 1 < len(starts) else None))
+    return jobs
+
+
+def analyze_segment(path, start, stop, regions, chunk_size=32):
+    """Counts the changed pixels of every region for frames 'start' to 'stop' (excluded) of a recording.
+
+    Each frame is compared with the one before it, so segments chain up
+    exactly; the first frame of a recording counts 0. Returns the counts as
+    a (frames, regions) array and the size of each region in pixels.
+    """
+    source = mg.ReplayCaptureSource(path)
+    source.open()
+    try:
+        source.seek(max(0, start - 1))
+        first_frame = source.read()
+        if first_frame is None:
+            return np.zeros((0, len(regions)), dtype=np.int64), [0] * len(regions)
+        height, width = first_frame.shape
+        monitored = [mg.MonitoredRegion(name, bbox) for name, bbox in regions]
+        mg.assign_region_views(monitored, None, first_frame.shape)
+        sizes = [first_frame[region.view].size for region in monitored]
+
+        # Slot 0 holds the last frame of the previous chunk
+        frames = np.empty((chunk_size + 1, height, width), dtype=np.uint8)
+        frames[0] = first_frame
+        mask = np.empty((chunk_size * height, width), dtype=np.uint8)
+        counts = [np.zeros((1, len(regions)), dtype=np.int64)] if start == 0 else []
+        remaining = None if stop is None else stop - max(start, 1)
+
+        while remaining is None or remaining > 0:
+            wanted = chunk_size if remaining is None else min(chunk_size, remaining)
+            read = 0
+            while read < wanted:
+                slot = frames[read + 1]
+                frame = source.read(slot)
+                if frame is None:
+                    break
+                if frame is not slot:
+                    raise ValueError(f"{path}: frame {start + read} is not {width}x{height}")
+                read += 1
+            if read == 0:
+                break
+
+            # Diff the whole chunk at once, frames are stacked as one tall image
+            chunk_mask = mask[:read * height]
+            cv2.absdiff(frames[:read].reshape(-1, width), frames[1:read + 1].reshape(-1, width), dst=chunk_mask)
+            cv2.threshold(chunk_mask, PIXEL_THRESHOLD, 1, cv2.THRESH_BINARY, dst=chunk_mask)
+            chunk_mask = chunk_mask.reshape(read, height, width)
+            chunk_counts = np.empty((read, len(regions)), dtype=np.int64)
+            for index, region in enumerate(monitored):
+                chunk_counts[:, index] = chunk_mask[(slice(None),) + region.view].sum(axis=(1, 2), dtype=np.int64)
+            counts.append(chunk_counts)
+
+            frames[0] = frames[read]
+            if remaining is not None:
+                remaining -= read
+            if read < wanted:
+                break
+    finally:
+        source.close()
+    return np.concatenate(counts) if counts else np.zeros((0, len(regions)), dtype=np.int64), sizes
+
+
+def run_segment(job):
+    path, start, stop, regions, chunk_size = job
+    return analyze_segment(path, start, stop, regions, chunk_size)
+
+
+def find_events(motion, fps, gap):
+    """Groups motion frames into events, joining runs separated by at most 'gap' seconds.
+
+    Returns (first frame, last frame) pairs.
+    """
+    frames = np.flatnonzero(motion)
+    if not len(frames):
+        return []
+    breaks = np.flatnonzero(np.diff(frames) > max(1, int(gap * fps)))
+    starts = np.concatenate(([frames[0]], frames[breaks + 1]))
+    ends = np.concatenate((frames[breaks], [frames[-1]]))
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def summarize(path, counts, sizes, fps, region_names, sensitivities, gap):
+    """Returns the per-frame scores and the motion events of one recording."""
+    sizes = np.array(sizes, dtype=np.int64)
+    scores = counts * 100 / np.maximum(sizes, 1)
+    events = []
+    for sensitivity in sensitivities:
+        # Same integer limit as FrameDiffEngine.motion_limit()
+        motion = counts > (100 - sensitivity) * sizes // 100
+        for index, name in enumerate(region_names):
+            for first, last in find_events(motion[:, index], fps, gap):
+                events.append({
+                    'file': path,
+                    'region': name,
+                    'sensitivity': sensitivity,
+                    'start': round(first / fps, 3),
+                    'end': round((last + 1) / fps, 3),
+                    'motion_frames': int(motion[first:last + 1, index].sum()),
+                    'peak_score': round(float(scores[first:last + 1, index].max()), 3),
+                })
+    return scores, events
+
+
+def write_csv(csv_path, series, region_names):
+    with open(csv_path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['file', 'frame', 'time', 'region', 'changed_pixels', 'score'])
+        for path, fps, counts, scores in series:
+            for frame in range(len(counts)):
+                for index, name in enumerate(region_names):
+                    writer.writerow([path, frame, round(frame / fps, 3), name, int(counts[frame, index]),
+                                     round(float(scores[frame, index]), 3)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze recorded videos and image folders for motion, offline.")
+    parser.add_argument('paths', nargs='+', help="Video files or folders of images (sorted by name)")
+    parser.add_argument('--sensitivity', nargs='+', type=int, default=[50, 70, 90], help="Sensitivities evaluated in one pass")
+    parser.add_argument('--region', action='append', type=parse_region, default=[],
+                        help="NAME=LEFT,TOP,RIGHT,BOTTOM area in frame coordinates, repeatable (default: full frame)")
+    parser.add_argument('--fps', type=float, default=10, help="Frame rate of image folders and videos without one")
+    parser.add_argument('--gap', type=float, default=10, help="Seconds without motion that end an event (like the cooldown)")
+    parser.add_argument('--workers', type=int, default=0, help="Worker processes (0 = one per CPU core, 1 = no pool)")
+    parser.add_argument('--segment-frames', type=int, default=6000, help="Frames per job when splitting long recordings")
+    parser.add_argument('--chunk', type=int, default=32, help="Frames diffed per vectorized batch")
+    parser.add_argument('--csv', help="Write the per-frame scores to this CSV file")
+    parser.add_argument('--json', help="Write the events to this JSON file")
+    args = parser.parse_args(argv)
+
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        parser.error(f"not found: {', '.join(missing)}")
+    regions = args.region or [("Full frame", None)]
+    region_names = [name for name, bbox in regions]
+
+    start = time.perf_counter()
+    jobs = plan_segments(args.paths, args.segment_frames)
+    tasks = [(path, first, stop, regions, max(1, args.chunk)) for path, first, stop in jobs]
+    workers = min(len(tasks), args.workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_segment, tasks))
+    else:
+        results = [run_segment(task) for task in tasks]
+
+    # Segments come back in order, join them per recording
+    recordings = {}
+    for (path, first, stop), (counts, sizes) in zip(jobs, results):
+        recording = recordings.setdefault(path, {'counts': [], 'sizes': sizes})
+        recording['counts'].append(counts)
+        if any(sizes):
+            recording['sizes'] = sizes
+
+    series = []
+    events = []
+    files = []
+    real_time = 0.0
+    for path in args.paths:
+        counts = np.concatenate(recordings[path]['counts'])
+        source = mg.ReplayCaptureSource(path)
+        source.open()
+        fps = source.frame_rate() or args.fps
+        source.close()
+        scores, file_events = summarize(path, counts, recordings[path]['sizes'], fps, region_names, args.sensitivity, args.gap)
+        series.append((path, fps, counts, scores))
+        events.extend(file_events)
+        files.append({'path': path, 'frames': len(counts), 'fps': fps, 'duration': round(len(counts) / fps, 3)})
+        real_time += len(counts) / fps
+    elapsed = time.perf_counter() - start
+
+    for info in files:
+        print(f"\n{info['path']}: {info['frames']} frames, {info['duration']} s at {info['fps']:g} FPS")
+        for sensitivity in args.sensitivity:
+            counts = [sum(1 for event in events if event['file'] == info['path'] and event['sensitivity'] == sensitivity
+                          and event['region'] == name) for name in region_names]
+            print(f"  sensitivity {sensitivity:>3}: " + ", ".join(f"{name} {count} events" for name, count in zip(region_names, counts)))
+    total_frames = sum(info['frames'] for info in files)
+    speed = f", {real_time / elapsed:.0f}x real time" if elapsed > 0 else ""
+    print(f"\nAnalyzed {total_frames} frames in {elapsed:.2f} s with {workers} worker(s){speed}")
+
+    if args.csv:
+        write_csv(args.csv, series, region_names)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump({'files': files, 'sensitivities': args.sensitivity, 'regions': region_names, 'events': events},
+                      json_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
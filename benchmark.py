@@ -0,0 +1,284 @@
+"""Headless benchmark for the MotionGuard detection pipeline.
+
+Drives MotionDetector from synthetic frame generators (or a recorded video /
+image folder) without a display, and reports frames per second, per-stage
+latency percentiles, peak memory and motion-to-alert latency.
+
+With --pyramid, every case also runs with the full-resolution engine as a
+reference and with the pyramid engine at each factor, and reports how many
+frames got a different motion decision than the reference.
+
+Examples:
+    python benchmark.py
+    python benchmark.py --resolution 3840x2160 --pattern static moving --frames 300
+    python benchmark.py --replay recording.mp4 --json results.json
+    python benchmark.py --resolution 3840x2160 --pyramid 4 8
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import MotionGuard_V04 as mg
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+PATTERNS = ('static', 'flicker', 'moving', 'full')
+
+
+class SyntheticCaptureSource(mg.CaptureSource):
+    """Generates grayscale frames following a motion pattern.
+
+    - static: the same frame every time
+    - flicker: low-amplitude noise below the pixel threshold on every frame
+    - moving: a bright block crossing the frame
+    - full: the whole scene changes on every frame
+
+    The first 'warmup' frames are static, 'motion_start' holds the
+    perf_counter time the first frame with motion was captured.
+    """
+
+    def __init__(self, shape, pattern, frames, warmup=10, seed=0):
+        super().__init__(None)
+        self.shape = shape
+        self.pattern = pattern
+        self.frames = frames
+        self.warmup = warmup
+        self.index = 0
+        self.motion_start = None
+        rng = np.random.default_rng(seed)
+        self.base = rng.integers(0, 200, shape, dtype=np.uint8)
+        self.alternate = rng.integers(0, 200, shape, dtype=np.uint8)
+        self.noise = [rng.integers(0, 20, shape, dtype=np.uint8) for _ in range(4)]
+        self.buffer = np.empty(shape, dtype=np.uint8)
+
+    def capture(self):
+        if self.index > self.frames:
+            return None
+        index = self.index
+        self.index += 1
+        frame = self.buffer
+        np.copyto(frame, self.base)
+        if index < self.warmup or self.pattern == 'static':
+            return frame
+
+        moved = False
+        if self.pattern == 'flicker':
+            np.add(frame, self.noise[index % len(self.noise)], out=frame)
+        elif self.pattern == 'moving':
+            height, width = self.shape
+            size_y, size_x = max(1, height // 4), max(1, width // 4)
+            x = (index * max(1, width // 50)) % max(1, width - size_x)
+            frame[height // 3:height // 3 + size_y, x:x + size_x] = 255
+            moved = True
+        elif self.pattern == 'full' and (index - self.warmup) % 2 == 0:
+            np.copyto(frame, self.alternate)
+            moved = True
+
+        if moved and self.motion_start is None:
+            self.motion_start = time.perf_counter()
+        return frame
+
+    def convert(self, raw, out=None):
+        return mg.copy_into(raw, out)
+
+
+def split_regions(shape, count, sensitivity):
+    """Splits the frame into 'count' vertical strips."""
+    height, width = shape
+    step = width // count
+    return [
+        mg.MonitoredRegion(f"Region {i + 1}", (i * step, 0, width if i == count - 1 else (i + 1) * step, height), sensitivity)
+        for i in range(count)
+    ]
+
+
+def percentiles(values):
+    """Returns p50/p95/p99 in milliseconds."""
+    if not values:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+    p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+    return {'p50': round(float(p50), 3), 'p95': round(float(p95), 3), 'p99': round(float(p99), 3)}
+
+
+def engine_variants(args):
+    """Returns the (name, MotionDetector engine options) to benchmark."""
+    default = ('tiled' if args.tile_size > 0 else 'full', {'tile_size': args.tile_size})
+    if not args.pyramid:
+        return [default]
+    variants = [('full', {'tile_size': 0})]
+    if args.tile_size > 0:
+        variants.append(default)
+    for factor in args.pyramid:
+        variants.append((f"pyramid 1/{factor}", {'tile_size': 0, 'pyramid': factor, 'pyramid_margin': args.pyramid_margin}))
+    return variants
+
+
+def compare_decisions(decisions, reference):
+    """Counts the frames where the motion decision of any region differs from the reference."""
+    missed = extra = 0
+    for frame, expected in zip(decisions, reference):
+        if frame != expected:
+            missed += any(want and not got for got, want in zip(frame, expected))
+            extra += any(got and not want for got, want in zip(frame, expected))
+    return {'missed': missed, 'extra': extra, 'compared': min(len(decisions), len(reference))}
+
+
+def run_case(source, args, label, options=None):
+    """Runs the detector over a source and returns the measured statistics.
+
+    'options' are extra MotionDetector engine arguments (tile_size, pyramid...).
+    """
+    first_alert = []
+
+    def on_motion(regions):
+        if not first_alert:
+            first_alert.append(time.perf_counter())
+
+    # Without a bbox the source's full frame is used, regions are strips of it
+    if isinstance(source, SyntheticCaptureSource):
+        regions = split_regions(source.shape, args.regions, args.sensitivity)
+    else:
+        regions = [mg.MonitoredRegion("Full frame", None, args.sensitivity)]
+
+    options = dict(options or {})
+    tile_size = options.pop('tile_size', args.tile_size)
+    detector = mg.MotionDetector(source, regions, tile_size, args.sample_step, args.threads, on_motion=on_motion, **options)
+    decisions = []
+    scheduler = mg.FrameScheduler(args.fps, args.fps, 0) if args.fps else None
+    stage_samples = {stage: [] for stage in mg.MotionDetector.STAGES}
+
+    if args.trace_memory:
+        tracemalloc.start()
+    try:
+        if not detector.start():
+            print(f"{label}: source produced no frames")
+            return None
+        frames = 0
+        start = time.perf_counter()
+        while args.frames == 0 or frames < args.frames:
+            if detector.step() is None:
+                break
+            frames += 1
+            decisions.append(tuple(region.motion for region in regions))
+            for stage, value in detector.stage_times.items():
+                stage_samples[stage].append(value)
+            if scheduler is not None:
+                scheduler.wait()
+        elapsed = time.perf_counter() - start
+        peak_traced = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+    finally:
+        if args.trace_memory:
+            tracemalloc.stop()
+        detector.close()
+
+    motion_start = getattr(source, 'motion_start', None)
+    result = {
+        'case': label,
+        'frames': frames,
+        'fps': round(frames / elapsed, 1) if elapsed > 0 else 0.0,
+        'stages_ms': {stage: percentiles(values) for stage, values in stage_samples.items()},
+        'motion_to_alert_ms': round((first_alert[0] - motion_start) * 1000, 3) if first_alert and motion_start else None,
+        'missed_deadlines': scheduler.missed_deadlines if scheduler is not None else 0,
+    }
+    escalations = [(region.engine.escalations, region.engine.comparisons) for region in regions
+                   if isinstance(region.engine, mg.PyramidDiffEngine)]
+    if escalations:
+        compared = sum(total for _, total in escalations)
+        result['escalation_rate'] = round(sum(count for count, _ in escalations) / compared, 3) if compared else 0.0
+    result['decisions'] = decisions
+    if peak_traced is not None:
+        result['peak_traced_mb'] = round(peak_traced / 2 ** 20, 2)
+    if resource is not None:
+        # ru_maxrss is in KiB on Linux. It is the high-water mark of the whole
+        # process, so it covers this case and every case run before it.
+        result['process_peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def print_result(result):
+    print(f"\n{result['case']}: {result['frames']} frames, {result['fps']} FPS")
+    for stage, stats in result['stages_ms'].items():
+        print(f"  {stage:<9} p50 {stats['p50']:>8.3f} ms  p95 {stats['p95']:>8.3f} ms  p99 {stats['p99']:>8.3f} ms")
+    latency = result['motion_to_alert_ms']
+    print(f"  motion-to-alert: {'n/a' if latency is None else f'{latency} ms'}")
+    if 'escalation_rate' in result:
+        print(f"  full-resolution escalations: {result['escalation_rate'] * 100:.1f}% of region comparisons")
+    if 'accuracy' in result:
+        accuracy = result['accuracy']
+        print(f"  vs reference: {accuracy['missed']} missed, {accuracy['extra']} extra motion frames out of {accuracy['compared']}")
+    if result['missed_deadlines']:
+        print(f"  missed deadlines: {result['missed_deadlines']}")
+    if 'peak_traced_mb' in result:
+        print(f"  peak traced memory: {result['peak_traced_mb']} MB")
+    if 'process_peak_rss_mb' in result:
+        print(f"  process peak RSS (cumulative over cases): {result['process_peak_rss_mb']} MB")
+
+
+def parse_resolution(value):
+    width, height = value.lower().split('x')
+    return int(height), int(width)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the MotionGuard detection pipeline without a display.")
+    parser.add_argument('--resolution', nargs='+', default=['1920x1080'], help="Frame sizes as WIDTHxHEIGHT")
+    parser.add_argument('--pattern', nargs='+', default=list(PATTERNS), choices=PATTERNS, help="Synthetic motion patterns")
+    parser.add_argument('--replay', nargs='*', default=[], help="Recorded videos or image folders to benchmark instead")
+    parser.add_argument('--frames', type=int, default=200, help="Frames per case (0 = until the replay ends)")
+    parser.add_argument('--warmup', type=int, default=10, help="Static frames before synthetic motion starts")
+    parser.add_argument('--regions', type=int, default=1, help="Number of regions the synthetic frame is split into")
+    parser.add_argument('--sensitivity', type=int, default=95, help="High enough for the moving block to trigger")
+    parser.add_argument('--tile-size', type=int, default=0, help="Tile size of the sampled tiled engine (0 = exact full-frame engine)")
+    parser.add_argument('--sample-step', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=0, help="Region scoring threads (0 = auto)")
+    parser.add_argument('--pyramid', nargs='*', type=int, default=[], help="Also run the pyramid engine with these factors (e.g. 4 8)")
+    parser.add_argument('--pyramid-margin', type=float, default=2, help="Pyramid escalation margin, in percent of the region")
+    parser.add_argument('--fps', type=float, default=0, help="Pace frames like the live loop (0 = as fast as possible)")
+    parser.add_argument('--trace-memory', action='store_true', help="Report peak traced allocations (slower)")
+    parser.add_argument('--json', help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = []
+    variants = engine_variants(args)
+    if args.replay:
+        cases = [(f"replay {path}", lambda path=path: mg.ReplayCaptureSource(path)) for path in args.replay]
+    else:
+        cases = [
+            (f"{resolution} {pattern}",
+             lambda shape=parse_resolution(resolution), pattern=pattern: SyntheticCaptureSource(shape, pattern, args.frames, args.warmup))
+            for resolution in args.resolution for pattern in args.pattern
+        ]
+
+    for label, make_source in cases:
+        # Every variant replays the same frames, the first one is the reference
+        reference = None
+        for name, options in variants:
+            result = run_case(make_source(), args, f"{label} [{name}]" if len(variants) > 1 else label, options)
+            if result is None:
+                continue
+            if reference is None:
+                reference = result['decisions']
+            elif len(variants) > 1:
+                result['accuracy'] = compare_decisions(result['decisions'], reference)
+            results.append(result)
+
+    results = [result for result in results if result is not None]
+    for result in results:
+        del result['decisions']
+    for result in results:
+        print_result(result)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""EmailDispatcher against a local stand-in SMTP server.
+
+Run with: python -m pytest tests
+"""
+import os
+import socketserver
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MotionGuard_V04 as mg  # noqa: E402
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib, records every message received."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 localhost test SMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data.rstrip(b"\r\n") == b".":
+                        break
+                    lines.append(data.decode())
+                self.reply("250 OK")
+                with server.lock:
+                    server.messages.append((time.time(), ''.join(lines)))
+                if server.drop_after_message:
+                    return  # Close the connection without QUIT, like an idle timeout
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class StandInSMTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, drop_after_message=False):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.drop_after_message = drop_after_message
+
+
+def subject_of(message):
+    for line in message.splitlines():
+        if line.startswith("Subject: "):
+            return line[len("Subject: "):]
+    return None
+
+
+class EmailDispatcherTest(unittest.TestCase):
+
+    def start(self, min_interval, drop_after_message=False):
+        self.smtp = StandInSMTPServer(drop_after_message)
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+        settings = {
+            'server': '127.0.0.1', 'port': str(self.smtp.server_address[1]), 'email': 'guard@example.com',
+            'password': '', 'recipient': 'owner@example.com', 'subject': 'Motion detected', 'body': 'Motion alert',
+        }
+        self.metrics = mg.Metrics()
+        self.dispatcher = mg.EmailDispatcher(settings, min_interval=min_interval, metrics=self.metrics)
+        self.dispatcher.start()
+        self.addCleanup(self.dispatcher.stop)
+
+    def wait_for_messages(self, count, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self.smtp.lock:
+                if len(self.smtp.messages) >= count:
+                    return list(self.smtp.messages)
+            time.sleep(0.01)
+        self.fail(f"expected {count} messages, got {len(self.smtp.messages)}")
+
+    def test_burst_becomes_one_digest(self):
+        self.start(min_interval=0.5)
+        self.dispatcher.notify(["door"])
+        self.wait_for_messages(1)
+        for name in ("door", "desk", "window", "door"):
+            self.dispatcher.notify([name])
+        messages = self.wait_for_messages(2)
+        time.sleep(0.7)  # Nothing else may follow
+        self.assertEqual(len(self.smtp.messages), 2)
+        self.assertEqual(subject_of(messages[0][1]), "Motion detected")
+        self.assertEqual(subject_of(messages[1][1]), "Motion detected (4 events)")
+        for name in ("door", "desk", "window"):
+            self.assertIn(name, messages[1][1])
+        self.assertEqual(self.metrics.counters[self.metrics.key('email_events_total', {})], 5)
+
+    def test_rate_limit_holds(self):
+        min_interval = 0.3
+        self.start(min_interval=min_interval)
+        end = time.time() + 1.0
+        while time.time() < end:
+            self.dispatcher.notify(["door"])
+            time.sleep(0.02)
+        self.wait_for_messages(3)
+        time.sleep(min_interval + 0.2)  # Let the last digest go out
+        with self.smtp.lock:
+            times = [received for received, _ in self.smtp.messages]
+        self.assertLessEqual(len(times), 1 + int(1.0 / min_interval) + 1)
+        for earlier, later in zip(times, times[1:]):
+            self.assertGreaterEqual(later - earlier, min_interval - 0.05)
+
+    def test_reconnects_after_server_drop(self):
+        self.start(min_interval=0, drop_after_message=True)
+        self.dispatcher.notify(["door"])
+        self.wait_for_messages(1)
+        time.sleep(0.1)  # Let the server close the session
+        self.dispatcher.notify(["desk"])
+        messages = self.wait_for_messages(2)
+        self.assertIn("desk", messages[1][1])
+        self.assertEqual(self.smtp.connections, 2)
+        self.assertNotIn(self.metrics.key('emails_failed_total', {}), self.metrics.counters)
+
+
+if __name__ == '__main__':
+    unittest.main()
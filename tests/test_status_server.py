@@ -0,0 +1,195 @@
+"""StatusServer on localhost: status JSON, WebSocket messages, shared MJPEG previews and stop().
+
+Run with: python -m pytest tests
+"""
+import base64
+import hashlib
+import json
+import os
+import socket
+import sys
+import time
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import MotionGuard_V04 as mg  # noqa: E402
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def read_headers(stream):
+    """Reads an HTTP response head, returns the status line and the headers."""
+    status = stream.readline().decode().strip()
+    headers = {}
+    while True:
+        line = stream.readline().decode().strip()
+        if not line:
+            return status, headers
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+def read_websocket_message(stream):
+    """Reads one unmasked server frame, returns (opcode, payload)."""
+    header = stream.read(2)
+    if len(header) < 2:
+        return None, b''
+    length = header[1] & 0x7F
+    if length == 126:
+        length = int.from_bytes(stream.read(2), 'big')
+    elif length == 127:
+        length = int.from_bytes(stream.read(8), 'big')
+    return header[0] & 0x0F, stream.read(length)
+
+
+def read_jpeg_part(stream):
+    """Reads one part of a multipart/x-mixed-replace stream, returns the JPEG bytes."""
+    boundary = stream.readline()
+    if not boundary:
+        return None
+    assert boundary.strip() == b'--frame', boundary
+    _, headers = read_headers(stream)
+    jpeg = stream.read(int(headers['content-length']))
+    stream.readline()  # CRLF after the part
+    return jpeg
+
+
+class StatusServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = mg.Metrics()
+        self.server = mg.StatusServer('127.0.0.1', 0, preview_fps=0, metrics=self.metrics)
+        self.assertTrue(self.server.start())
+        self.addCleanup(self.server.stop)
+        self.shape = (512, 1024)
+        self.regions = [mg.MonitoredRegion("left", (0, 0, 512, 512)), mg.MonitoredRegion("right", (512, 0, 1024, 512))]
+        mg.assign_region_views(self.regions, None, self.shape)
+        self.server.set_regions(self.regions)
+        self.assertTrue(wait_until(lambda: len(self.server.regions) == 2))
+
+    def connect(self, request, receive_buffer=None):
+        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if receive_buffer:
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+        client.settimeout(5)
+        client.connect(('127.0.0.1', self.server.port))
+        self.addCleanup(client.close)
+        client.sendall(request)
+        return client, client.makefile('rb')
+
+    def open_websocket(self):
+        key = base64.b64encode(os.urandom(16))
+        client, stream = self.connect(
+            b"GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            b"Sec-WebSocket-Key: " + key + b"\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        )
+        status, headers = read_headers(stream)
+        self.assertIn("101", status)
+        accept = base64.b64encode(hashlib.sha1(key + mg.WEBSOCKET_GUID.encode()).digest()).decode()
+        self.assertEqual(headers['sec-websocket-accept'], accept)
+        return client, stream
+
+    def open_preview(self, index, receive_buffer=None):
+        client, stream = self.connect(f"GET /preview/{index}.mjpg HTTP/1.1\r\nHost: localhost\r\n\r\n".encode(),
+                                      receive_buffer)
+        return client, stream
+
+    def test_status_json(self):
+        self.server.publish_motion(True)
+        _, stream = self.connect(b"GET /status HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        status, headers = read_headers(stream)
+        self.assertIn("200", status)
+        self.assertEqual(headers['content-type'], 'application/json')
+        snapshot = json.loads(stream.read(int(headers['content-length'])))
+        self.assertEqual(snapshot['type'], 'status')
+        self.assertEqual(snapshot['regions'], ["left", "right"])
+        self.assertTrue(snapshot['motion'])
+
+    def test_websocket_messages_in_order(self):
+        _, stream = self.open_websocket()
+        opcode, payload = read_websocket_message(stream)
+        self.assertEqual(opcode, 0x1)
+        self.assertEqual(json.loads(payload)['type'], 'status')
+
+        region = self.regions[0]
+        region.score, region.changed_pixels = 12.5, 32768
+        self.server.publish_motion(True)
+        self.server.publish_event([region], ['sound'])
+        self.server.publish_motion(False)
+        messages = [json.loads(read_websocket_message(stream)[1]) for _ in range(3)]
+        self.assertEqual([message['type'] for message in messages], ['motion', 'event', 'motion'])
+        self.assertTrue(messages[0]['motion'])
+        self.assertEqual(messages[1]['regions'][0]['name'], "left")
+        self.assertEqual(messages[1]['regions'][0]['changed_pixels'], 32768)
+        self.assertEqual(messages[1]['alerts'], ['sound'])
+        self.assertFalse(messages[2]['motion'])
+
+    def test_preview_frame_shared_and_slow_client_skips(self):
+        encoded = []
+        encode_regions = self.server.encode_regions
+        self.server.encode_regions = lambda frame, regions: encoded.append(1) or encode_regions(frame, regions)
+
+        streams = []
+        for _ in range(2):
+            _, stream = self.open_preview(0)
+            self.assertIn("200", read_headers(stream)[0])
+            streams.append(stream)
+        # Never reads, so its socket fills up and it falls behind
+        slow, slow_stream = self.open_preview(0, receive_buffer=4096)
+        self.assertTrue(wait_until(lambda: self.server.preview_clients == 3))
+
+        # Noise does not compress, each JPEG is far larger than the socket buffers
+        rng = np.random.default_rng(0)
+        frames = 40
+        for _ in range(frames):
+            frame = rng.integers(0, 256, self.shape, dtype=np.uint8)
+            self.assertTrue(wait_until(self.server.wants_frame))
+            self.server.publish_frame(frame)
+            jpegs = [read_jpeg_part(stream) for stream in streams]
+            self.assertIsNotNone(jpegs[0])
+            self.assertEqual(jpegs[0], jpegs[1])  # Same encoded bytes for both clients
+        self.assertEqual(len(encoded), frames)  # One encoding per frame, not per client
+
+        # The slow client catches up on the newest frame, skipping the ones in between
+        received = 0
+        read_headers(slow_stream)
+        slow.settimeout(1)
+        try:
+            while read_jpeg_part(slow_stream) is not None:
+                received += 1
+        except socket.timeout:
+            pass
+        self.assertLess(received, frames)
+        self.assertTrue(wait_until(
+            lambda: self.metrics.counters.get(self.metrics.key('preview_frames_dropped_total', {}), 0) > 0))
+
+    def test_stop_with_clients_connected(self):
+        _, websocket = self.open_websocket()
+        read_websocket_message(websocket)
+        _, preview = self.open_preview(1)
+        read_headers(preview)
+        self.assertTrue(wait_until(lambda: self.server.preview_clients == 1 and len(self.server.websocket_clients) == 1))
+
+        with self.assertNoLogs('asyncio'):
+            self.server.stop()
+        self.assertFalse(self.server.thread.is_alive())
+        # Both connections are closed by the server
+        self.assertEqual(preview.read(), b'')
+        while True:
+            opcode, _ = read_websocket_message(websocket)
+            if opcode is None:
+                break
+
+
+if __name__ == '__main__':
+    unittest.main()